@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+################################################################################
+#
+# async_csv_util - asyncio csv reader and writer which accept unicode string items
+#                  compatible with Python 3.6+
+# Copyright (C) 2016-present Himawari Tachibana <fieliapm@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+
+import codecs
+import collections
+import inspect
+import io
+import itertools
+import csv
+
+import csv_util
+
+
+class LineFeeder(object):
+    '''Iterator of queued lines for csv.reader.
+    It raises StopIteration when queue is empty, and continues after more lines are queued.
+    '''
+    def __init__(self):
+        self.line_queue = collections.deque()
+
+    def append(self, line):
+        self.line_queue.append(line)
+
+    def __len__(self):
+        return len(self.line_queue)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return self.line_queue.popleft()
+        except IndexError:
+            raise StopIteration
+
+
+class CSVAsyncReader(object):
+    '''Incremental csv reader of asyncio.StreamReader or async iterable of bytes.
+    Data is read only when rows are consumed, so backpressure reaches the network stream.
+    Records whose quoted fields span several chunks are parsed when their closing quote arrives.
+    It assumes csv.excel like dialect: quote character inside field is escaped by doubling.
+    '''
+    DEFAULT_CHUNK_SIZE = 64*1024
+
+    def __init__(self, source, dialect=csv.excel, encoding='utf-8', chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        self.source = source
+        self.encoding = encoding
+        self.chunk_size = chunk_size
+        self.feeder = LineFeeder()
+        self.reader = csv.reader(self.feeder, dialect=dialect, **kwargs)
+        if self.reader.dialect.quoting == csv.QUOTE_NONE:
+            self.quotechar = None
+        else:
+            self.quotechar = self.reader.dialect.quotechar
+
+    @property
+    def dialect(self):
+        return self.reader.dialect
+
+    @property
+    def line_num(self):
+        return self.reader.line_num
+
+    async def __iter_chunks(self):
+        if callable(getattr(self.source, 'read', None)):
+            while True:
+                chunk = await self.source.read(self.chunk_size)
+                if len(chunk) == 0:
+                    break
+                yield chunk
+        else:
+            async for chunk in self.source:
+                yield chunk
+
+    def __parse_lines(self, line_list, is_quoted):
+        row_list = []
+        feeder = self.feeder
+        quotechar = self.quotechar
+        for line in line_list:
+            feeder.append(line)
+            if quotechar is not None and line.count(quotechar)&0x1:
+                is_quoted = not is_quoted
+            if not is_quoted:
+                # queued lines make exactly one complete record
+                row_list.append(next(self.reader))
+        return (row_list, is_quoted)
+
+    async def iter_batches(self, batch_size=None):
+        '''Yield lists of rows.
+        If batch_size is None, every list contains rows completed by one chunk of data,
+        otherwise every list contains at most batch_size rows.
+        '''
+        if batch_size is not None:
+            async for batch in self.__iter_sized_batches(batch_size):
+                yield batch
+            return
+
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        partial_line = u''
+        is_quoted = False
+        async for chunk in self.__iter_chunks():
+            line_list = (partial_line+decoder.decode(chunk)).split(u'\n')
+            partial_line = line_list.pop()
+            (row_list, is_quoted) = self.__parse_lines([line+u'\n' for line in line_list], is_quoted)
+            if len(row_list) > 0:
+                yield row_list
+        partial_line += decoder.decode(b'', True)
+        line_list = [partial_line] if len(partial_line) > 0 else []
+        (row_list, is_quoted) = self.__parse_lines(line_list, is_quoted)
+        if len(self.feeder) > 0:
+            # unterminated quoted field at end of data, let csv.reader decide as it does for file
+            row_list.extend(self.reader)
+        if len(row_list) > 0:
+            yield row_list
+
+    async def __iter_sized_batches(self, batch_size):
+        batch = []
+        async for row_list in self.iter_batches():
+            batch.extend(row_list)
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+        if len(batch) > 0:
+            yield batch
+
+    async def __iter_rows(self):
+        async for row_list in self.iter_batches():
+            for row in row_list:
+                yield row
+
+    def __aiter__(self):
+        return self.__iter_rows()
+
+
+class CSVAsyncWriter(object):
+    '''csv writer of asyncio.StreamWriter or any object which has write() and coroutine drain().
+    Every write awaits drain(), so writer follows backpressure of the network stream.
+    '''
+    def __init__(self, stream, dialect=csv.excel, encoding='utf-8', **kwargs):
+        self.stream = stream
+        self.sink = io.BytesIO()
+        self.writer = csv_util.CSVUnicodeWriter(self.sink, dialect=dialect, encoding=encoding, **kwargs)
+
+    @property
+    def dialect(self):
+        return self.writer.dialect
+
+    async def __send(self):
+        data = self.sink.getvalue()
+        if len(data) == 0:
+            return
+        self.sink.seek(0)
+        self.sink.truncate(0)
+        result = self.stream.write(data)
+        if inspect.isawaitable(result):
+            await result
+        drain = getattr(self.stream, 'drain', None)
+        if callable(drain):
+            await drain()
+
+    async def writerow(self, row):
+        self.writer.writerow(row)
+        await self.__send()
+
+    async def writerows_batch(self, rows):
+        self.writer.writerows_batch(rows)
+        await self.__send()
+
+    async def writerows(self, rows):
+        row_iter = iter(rows)
+        while True:
+            row_list = list(itertools.islice(row_iter, csv_util.WRITEROWS_BATCH_SIZE))
+            if len(row_list) == 0:
+                break
+            await self.writerows_batch(row_list)
+
+
+# test case
+
+import unittest
+import asyncio
+
+
+class MemoryStreamWriter(object):
+    def __init__(self):
+        self.data = io.BytesIO()
+        self.drain_count = 0
+
+    def write(self, data):
+        self.data.write(data)
+
+    async def drain(self):
+        self.drain_count += 1
+
+
+class AsyncCSVTestCase(unittest.TestCase):
+    def setUp(self):
+        self.__TEST_DATA = [
+            [u'E6新幹線 "こまち"', u'Japan', u'電車', u'320.0'],
+            [u'Infiniti G35 (V35), by Nissan', u'', u'自動車', u'250.0'],
+            [u'multi\r\nline "quoted"\nfield', u'x'],
+            [],
+        ]
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        self.loop.close()
+
+    def __make_csv_bytes(self, encoding='utf-8'):
+        stream = MemoryStreamWriter()
+        csv_writer = CSVAsyncWriter(stream, encoding=encoding)
+        self.loop.run_until_complete(csv_writer.writerows(self.__TEST_DATA*10))
+        self.assertTrue(stream.drain_count > 0, 'stream is not drained')
+        return stream.data.getvalue()
+
+    async def __iter_chunks(self, data, chunk_size):
+        for i in range(0, len(data), chunk_size):
+            await asyncio.sleep(0)
+            yield data[i:i+chunk_size]
+
+    async def __read_rows(self, source, encoding='utf-8'):
+        csv_reader = CSVAsyncReader(source, encoding=encoding, chunk_size=5)
+        row_list = []
+        async for row in csv_reader:
+            row_list.append(row)
+        return (row_list, csv_reader.line_num)
+
+    def test_async_iterable(self):
+        for encoding in ('utf-8', 'shift-jis'):
+            data = self.__make_csv_bytes(encoding)
+            for chunk_size in (1, 3, 7, 1024):
+                (row_list, line_num) = self.loop.run_until_complete(self.__read_rows(self.__iter_chunks(data, chunk_size), encoding))
+                self.assertEqual(row_list, self.__TEST_DATA*10)
+                self.assertEqual(line_num, 60, 'line_num is wrong')
+
+    def test_stream_reader(self):
+        data = self.__make_csv_bytes()
+        async def read():
+            stream_reader = asyncio.StreamReader()
+            stream_reader.feed_data(data[:-1])
+            stream_reader.feed_data(data[-1:])
+            stream_reader.feed_eof()
+            return await self.__read_rows(stream_reader)
+        (row_list, line_num) = self.loop.run_until_complete(read())
+        self.assertEqual(row_list, self.__TEST_DATA*10)
+
+    def test_batches(self):
+        data = self.__make_csv_bytes()+u'last,"row"'.encode('utf-8')
+        async def read():
+            csv_reader = CSVAsyncReader(self.__iter_chunks(data, 16))
+            return [batch async for batch in csv_reader.iter_batches(3)]
+        batch_list = self.loop.run_until_complete(read())
+        self.assertTrue(all(len(batch) == 3 for batch in batch_list[:-1]), 'batch size is wrong')
+        self.assertEqual(list(itertools.chain.from_iterable(batch_list)), self.__TEST_DATA*10+[[u'last', u'row']])
+
+
+if __name__ == '__main__':
+    unittest.main()
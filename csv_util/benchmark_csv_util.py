@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+################################################################################
+#
+# csv_util - csv reader and writer which accept unicode string items
+#            compatible with Python 2 & 3
+# Copyright (C) 2016-present Himawari Tachibana <fieliapm@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+
+# benchmark of csv_util
+# usage: python benchmark_csv_util.py [row_count]
+
+
+import sys
+import io
+import timeit
+
+import csv_util
+
+
+TEST_ROW = [u'E6新幹線 "こまち"', u'Japan', u'電車', u'320.0', u'Infiniti G35 (V35), by Nissan', u'', u'自動車', u'250.0']
+
+
+def make_csv_bytes(row_count, encoding='utf-8'):
+    fp = io.BytesIO()
+    csv_writer = csv_util.CSVUnicodeWriter(fp, encoding=encoding)
+    csv_writer.writerows([TEST_ROW]*row_count)
+    return fp.getvalue()
+
+
+def report(name, row_count, duration):
+    print('%-40s %12.0f rows/s %10.3f s' % (name, row_count/duration, duration))
+
+
+def measure(func):
+    start_time = timeit.default_timer()
+    row_count = func()
+    duration = timeit.default_timer()-start_time
+    return (row_count, duration)
+
+
+def benchmark_reader(csv_bytes, name, **kwargs):
+    def read():
+        row_count = 0
+        for row in csv_util.CSVUnicodeReader(io.BytesIO(csv_bytes), **kwargs):
+            row_count += 1
+        return row_count
+    report(name, *measure(read))
+
+
+def benchmark_writer(row_count, name, use_writerows, **kwargs):
+    def write():
+        csv_writer = csv_util.CSVUnicodeWriter(io.BytesIO(), **kwargs)
+        if use_writerows:
+            csv_writer.writerows([TEST_ROW]*row_count)
+        else:
+            for i in range(row_count):
+                csv_writer.writerow(TEST_ROW)
+        csv_writer.flush()
+        return row_count
+    report(name, *measure(write))
+
+
+def main(argv):
+    row_count = int(argv[1]) if len(argv) > 1 else 200000
+    csv_bytes = make_csv_bytes(row_count)
+
+    benchmark_reader(csv_bytes, 'CSVUnicodeReader')
+    benchmark_reader(csv_bytes, 'CSVUnicodeReader(fast=True)', fast=True)
+    benchmark_reader(csv_bytes, 'CSVUnicodeReader(fast=True, usecols)', fast=True, usecols=[0, 3])
+
+    benchmark_writer(row_count, 'CSVUnicodeWriter.writerow', False)
+    benchmark_writer(row_count, 'CSVUnicodeWriter.writerow(buffered)', False, buffer_size=65536)
+    benchmark_writer(row_count, 'CSVUnicodeWriter.writerows', True)
+    benchmark_writer(row_count, 'CSVUnicodeWriter.writerows(buffered)', True, buffer_size=65536)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
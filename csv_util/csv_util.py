@@ -26,10 +26,47 @@
 
 
 import sys
+import os
+import re
 import codecs
+import unicodedata
 import io
+import itertools
+import operator
+import collections
+import array
+import struct
+import mmap
+import threading
+import timeit
+import multiprocessing
+import gzip
+import bz2
 import csv
 
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import lzma
+except ImportError:
+    lzma = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+if sys.version_info[0] < 3:
+    imap = itertools.imap
+    ifilter = itertools.ifilter
+else:
+    imap = map
+    ifilter = filter
+
 
 def UTF8RecoderGenerator(fp, encoding):
     reader = codecs.getreader(encoding)(fp)
@@ -76,10 +113,387 @@ UTF8Recoder = UTF8RecoderGenerator
 #UTF8Recoder = UTF8RecoderObject
 
 
+FAST_READER_BUFFER_SIZE = 1024*1024
+
+
+class NonClosingTextIOWrapper(io.TextIOWrapper):
+    '''io.TextIOWrapper which does not close wrapped binary file when it is closed or garbage collected.
+    The binary file still belongs to its opener.
+    '''
+    def close(self):
+        pass
+
+
+class NonClosingBufferedReader(io.BufferedReader):
+    '''io.BufferedReader which does not close wrapped binary file when it is closed or garbage collected.'''
+    def close(self):
+        pass
+
+
+def fast_text_reader(fp, encoding, buffer_size=FAST_READER_BUFFER_SIZE):
+    return NonClosingTextIOWrapper(NonClosingBufferedReader(fp, buffer_size), encoding=encoding, newline='')
+
+
+class PrefixedReader(io.RawIOBase):
+    '''Raw reader which replays bytes already read from non-seekable file, then reads the rest of the file.'''
+    def __init__(self, prefix, fp):
+        self.prefix = prefix
+        self.fp = fp
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        if len(self.prefix) > 0:
+            data = self.prefix[:len(b)]
+            self.prefix = self.prefix[len(data):]
+        else:
+            data = self.fp.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def peek_head(fp, size):
+    '''Return (head, fp) where head is at most first size bytes of fp.
+    Returned fp still starts from head, it is original fp if fp supports peek() or is seekable.
+    peek() is preferred, because decompressor like gzip.GzipFile claims to be seekable
+    but seeking back rewinds the underlying file, which may be pipe.
+    peek() may return less than size bytes, which is not more than buffer size of fp.
+    '''
+    if callable(getattr(fp, 'peek', None)):
+        return (fp.peek(size)[:size], fp)
+    if callable(getattr(fp, 'seekable', None)) and fp.seekable():
+        position = fp.tell()
+        head = fp.read(size)
+        fp.seek(position)
+        return (head, fp)
+    head = fp.read(size)
+    return (head, io.BufferedReader(PrefixedReader(head, fp)))
+
+
+COMPRESSION_EXTENSION_DICT = {
+    '.gz': 'gzip',
+    '.bz2': 'bz2',
+    '.xz': 'xz',
+    '.lzma': 'xz',
+}
+
+COMPRESSION_MAGIC_LIST = [
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+]
+
+
+def infer_compression_from_name(fp):
+    name = getattr(fp, 'name', None)
+    if not isinstance(name, str):
+        return None
+    return COMPRESSION_EXTENSION_DICT.get(os.path.splitext(name)[1].lower())
+
+
+def infer_compression(fp):
+    '''Return (compression, fp), compression is chosen from file extension, then magic bytes.'''
+    compression = infer_compression_from_name(fp)
+    if compression is not None:
+        return (compression, fp)
+    (head, fp) = peek_head(fp, 8)
+    for (magic, compression) in COMPRESSION_MAGIC_LIST:
+        if head.startswith(magic):
+            return (compression, fp)
+    return (None, fp)
+
+
+def __open_compressed(fp, compression, mode):
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=fp, mode=mode)
+    if compression == 'bz2':
+        return bz2.BZ2File(fp, mode=mode)
+    if compression == 'xz':
+        if lzma is None:
+            raise ValueError('lzma is not supported')
+        return lzma.LZMAFile(fp, mode=mode)
+    raise ValueError('unknown compression %s' % (repr(compression),))
+
+
+class ThreadedPrefetchReader(io.RawIOBase):
+    '''Raw reader which reads fp in background thread, so decompression overlaps with parsing.
+    At most queue_size blocks of block_size bytes are read ahead.
+    '''
+    def __init__(self, fp, block_size=1024*1024, queue_size=4):
+        self.fp = fp
+        self.block_size = block_size
+        self.block_queue = queue.Queue(queue_size)
+        self.block = b''
+        self.is_eof = False
+        self.is_stopped = False
+        self.thread = threading.Thread(target=self.__prefetch)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def __prefetch(self):
+        try:
+            while not self.is_stopped:
+                block = self.fp.read(self.block_size)
+                self.block_queue.put(block)
+                if len(block) == 0:
+                    break
+        except Exception as e:
+            self.block_queue.put(e)
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while len(self.block) == 0:
+            if self.is_eof:
+                return 0
+            block = self.block_queue.get()
+            if isinstance(block, Exception):
+                self.is_eof = True
+                raise block
+            if len(block) == 0:
+                self.is_eof = True
+                return 0
+            self.block = block
+        data = self.block[:len(b)]
+        self.block = self.block[len(data):]
+        b[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        self.is_stopped = True
+        # unblock prefetch thread waiting on full queue
+        while self.thread.is_alive():
+            try:
+                self.block_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.fp.close()
+        super(ThreadedPrefetchReader, self).close()
+
+
+DECOMPRESS_BUFFER_SIZE = 1024*1024
+
+
+def open_decompressed(fp, compression='infer', buffer_size=DECOMPRESS_BUFFER_SIZE, threaded=False):
+    '''Wrap binary file fp with streaming decompressor of gzip, bz2 or xz.
+    If compression is 'infer', it is chosen by infer_compression(), and fp is returned as is if it is not compressed.
+    If threaded is True, decompression runs in background thread.
+    '''
+    if compression == 'infer':
+        (compression, fp) = infer_compression(fp)
+    if compression is None:
+        return fp
+    decompressed_fp = __open_compressed(fp, compression, 'rb')
+    if threaded:
+        return io.BufferedReader(ThreadedPrefetchReader(decompressed_fp, block_size=buffer_size), buffer_size)
+    return io.BufferedReader(decompressed_fp, buffer_size)
+
+
+def open_compressed(fp, compression='infer'):
+    '''Wrap binary file fp with streaming compressor of gzip, bz2 or xz.
+    If compression is 'infer', it is chosen by file extension, and fp is returned as is if it is not compressed.
+    '''
+    if compression == 'infer':
+        compression = infer_compression_from_name(fp)
+    if compression is None:
+        return fp
+    return __open_compressed(fp, compression, 'wb')
+
+
+BOM_ENCODING_LIST = [
+    # UTF-32 LE BOM starts with UTF-16 LE BOM, so it is checked first
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+AUTO_ENCODING_CANDIDATES = ('utf-8', 'shift-jis', 'big5hkscs', 'gb18030', 'euc-kr', 'cp1252')
+AUTO_ENCODING_SAMPLE_SIZE = 64*1024
+
+__ASCII_CONTROL_PATTERN = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\x7f]')
+__NON_ASCII_PATTERN = re.compile(u'[^\x00-\x7f]')
+__SUSPICIOUS_CATEGORY_SET = frozenset(['Cc', 'Cf', 'Cn', 'Co', 'Cs', 'So', 'Sk'])
+
+
+def __score_decoded_sample(sample, encoding):
+    text = codecs.getincrementaldecoder(encoding)('replace').decode(sample)
+    score = len(__ASCII_CONTROL_PATTERN.findall(text))
+    for char in __NON_ASCII_PATTERN.findall(text):
+        if char == u'\ufffd':
+            score += 10
+        elif unicodedata.category(char) in __SUSPICIOUS_CATEGORY_SET:
+            score += 1
+    return score
+
+
+def detect_encoding(fp, sample_size=AUTO_ENCODING_SAMPLE_SIZE, candidates=AUTO_ENCODING_CANDIDATES):
+    '''Detect encoding from head of binary file fp, return (encoding, fp).
+    BOM is checked first, then valid UTF-8 sample is taken as UTF-8.
+    Otherwise every candidate decodes the sample, and the one with fewest undecodable or unlikely characters
+    (control, private use, unassigned, symbol) wins, earlier candidate wins a tie.
+    Returned fp still starts from head, see peek_head().
+    '''
+    (sample, fp) = peek_head(fp, sample_size)
+    for (bom, encoding) in BOM_ENCODING_LIST:
+        if sample.startswith(bom):
+            return (encoding, fp)
+    try:
+        # trailing incomplete character of sample is not an error
+        codecs.getincrementaldecoder('utf-8')().decode(sample, False)
+    except UnicodeDecodeError:
+        pass
+    else:
+        return ('utf-8', fp)
+    score_list = [(__score_decoded_sample(sample, encoding), i) for (i, encoding) in enumerate(candidates)]
+    return (candidates[min(score_list)[1]], fp)
+
+
+class CSVStats(object):
+    '''Throughput counters of csv reader and writer.
+    Reader measures decode time (including reading file) and parse time,
+    writer measures format time and encode time (including writing file).
+    progress_callback is called with this object at most once per progress_interval seconds.
+    '''
+    def __init__(self, progress_callback=None, progress_interval=1.0):
+        self.bytes_read = 0
+        self.bytes_written = 0
+        self.rows_read = 0
+        self.rows_written = 0
+        self.decode_time = 0.0
+        self.parse_time = 0.0
+        self.format_time = 0.0
+        self.encode_time = 0.0
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.start_time = timeit.default_timer()
+        self.last_progress_time = self.start_time
+
+    @property
+    def elapsed_time(self):
+        return timeit.default_timer()-self.start_time
+
+    @property
+    def rows_per_second(self):
+        return (self.rows_read+self.rows_written)/max(self.elapsed_time, 1e-9)
+
+    @property
+    def bytes_per_second(self):
+        return (self.bytes_read+self.bytes_written)/max(self.elapsed_time, 1e-9)
+
+    def report_progress(self, now):
+        if self.progress_callback is not None and now-self.last_progress_time >= self.progress_interval:
+            self.last_progress_time = now
+            self.progress_callback(self)
+
+    def __repr__(self):
+        return '%s(rows_read=%d, rows_written=%d, bytes_read=%d, bytes_written=%d, decode_time=%f, parse_time=%f, format_time=%f, encode_time=%f)' % (
+            type(self).__name__, self.rows_read, self.rows_written, self.bytes_read, self.bytes_written,
+            self.decode_time, self.parse_time, self.format_time, self.encode_time)
+
+
+class CountingReader(io.RawIOBase):
+    '''Raw reader which counts bytes read from fp into stats.bytes_read.'''
+    def __init__(self, fp, stats):
+        self.fp = fp
+        self.stats = stats
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.fp.read(len(b))
+        b[:len(data)] = data
+        self.stats.bytes_read += len(data)
+        return len(data)
+
+
+def _iter_timed_lines(text_fp, stats):
+    timer = timeit.default_timer
+    line_iter = iter(text_fp)
+    while True:
+        start_time = timer()
+        try:
+            line = next(line_iter)
+        except StopIteration:
+            stats.decode_time += timer()-start_time
+            break
+        stats.decode_time += timer()-start_time
+        yield line
+
+
 class CSVUnicodeReader(object):
-    def __init__(self, fp, dialect=csv.excel, encoding='utf-8', **kwargs):
-        recoder = UTF8Recoder(fp, encoding)
-        self.reader = csv.reader(recoder, dialect=dialect, **kwargs)
+    def __init__(self, fp, dialect=csv.excel, encoding='utf-8', fast=False, usecols=None, predicate=None, use_namedtuple=False, compression=None, threaded=False, stats=None, **kwargs):
+        '''If fast is True under Python 3, fp is decoded by io.TextIOWrapper with large buffer
+        and passed to csv.reader directly, without UTF8Recoder generator.
+        fp must be binary file object which supports read1() or read(), like file opened with mode 'rb' or io.BytesIO.
+
+        usecols is list of column indexes or header names.
+        If it contains header name, the first row is read as header and stored in attribute header.
+        If usecols is given, every row is projected to tuple of these columns right after parsing,
+        or namedtuple if use_namedtuple is True.
+        predicate is called with projected row, and rows for which it returns false are skipped.
+
+        compression is None, 'infer', 'gzip', 'bz2' or 'xz', see open_decompressed().
+        If threaded is True, decompression runs in background thread. Call close() if reading stops before end of file.
+
+        If encoding is 'auto', encoding is detected by detect_encoding() and stored in attribute encoding.
+        If UTF-8 is detected, fast path is taken under Python 3 even if fast is False.
+
+        If stats is CSVStats object, bytes, rows, decode time and parse time are counted into it.
+        Without stats, no instrumentation code is put into reading path.
+        '''
+        self.stats = stats
+        if stats is not None:
+            fp = io.BufferedReader(CountingReader(fp, stats))
+        self.stream = None
+        if compression is not None:
+            decompressed_fp = open_decompressed(fp, compression, threaded=threaded)
+            if decompressed_fp is not fp:
+                self.stream = decompressed_fp
+                fp = decompressed_fp
+        if encoding == 'auto':
+            (encoding, fp) = detect_encoding(fp)
+            if codecs.lookup(encoding).name in ('utf-8', 'utf-8-sig'):
+                fast = True
+        self.encoding = encoding
+        if fast and sys.version_info[0] >= 3:
+            text_fp = fast_text_reader(fp, encoding)
+        else:
+            text_fp = UTF8Recoder(fp, encoding)
+        if stats is not None:
+            text_fp = _iter_timed_lines(text_fp, stats)
+        self.reader = csv.reader(text_fp, dialect=dialect, **kwargs)
+        self.header = None
+        self.row_getter = None
+        self.row_type = None
+        self.predicate = predicate
+        if usecols is not None:
+            self.__init_projection(usecols, use_namedtuple)
+
+    def __init_projection(self, usecols, use_namedtuple):
+        usecols = list(usecols)
+        if len(usecols) == 0:
+            raise ValueError('usecols is empty')
+        if not all(isinstance(column, int) for column in usecols):
+            self.header = self.__next()
+        column_index_list = [column if isinstance(column, int) else self.header.index(column) for column in usecols]
+        if len(column_index_list) == 1:
+            column_index = column_index_list[0]
+            self.row_getter = lambda row: (row[column_index],)
+        else:
+            self.row_getter = operator.itemgetter(*column_index_list)
+        if use_namedtuple:
+            if self.header is not None:
+                field_name_list = [self.header[column_index] for column_index in column_index_list]
+            else:
+                field_name_list = ['column_%d' % (column_index,) for column_index in column_index_list]
+            self.row_type = collections.namedtuple('CSVRow', field_name_list, rename=True)
 
     @property
     def dialect(self):
@@ -104,8 +518,58 @@ class CSVUnicodeReader(object):
             else:
                 yield next_item
 
+    def __timed_row_generator(self, row_iter):
+        stats = self.stats
+        timer = timeit.default_timer
+        while True:
+            decode_time = stats.decode_time
+            start_time = timer()
+            try:
+                row = next(row_iter)
+            except StopIteration:
+                break
+            now = timer()
+            stats.parse_time += (now-start_time)-(stats.decode_time-decode_time)
+            stats.rows_read += 1
+            stats.report_progress(now)
+            yield row
+
     def __iter__(self):
-        return self.__next_generator()
+        if sys.version_info[0] < 3:
+            row_iter = self.__next_generator()
+        else:
+            # rows are already unicode string under Python 3
+            row_iter = iter(self.reader)
+        if self.stats is not None:
+            row_iter = self.__timed_row_generator(row_iter)
+        if self.row_getter is not None:
+            row_iter = imap(self.row_getter, row_iter)
+            if self.row_type is not None:
+                row_iter = imap(self.row_type._make, row_iter)
+        if self.predicate is not None:
+            row_iter = ifilter(self.predicate, row_iter)
+        return row_iter
+
+    def iter_batches(self, batch_size):
+        '''Yield lists of at most batch_size rows.'''
+        row_iter = iter(self)
+        while True:
+            batch = list(itertools.islice(row_iter, batch_size))
+            if len(batch) == 0:
+                break
+            yield batch
+
+    def close(self):
+        '''Close decompressor. fp is not closed.'''
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     #if sys.version_info[0] < 3:
     #    next = __next
@@ -113,8 +577,28 @@ class CSVUnicodeReader(object):
     #    __next__ = __next
 
 
+WRITEROWS_BATCH_SIZE = 1024
+
+
 class CSVUnicodeWriter(object):
-    def __init__(self, fp, dialect=csv.excel, encoding='utf-8', **kwargs):
+    def __init__(self, fp, dialect=csv.excel, encoding='utf-8', buffer_size=None, compression=None, stats=None, **kwargs):
+        '''If buffer_size is None, every writerow() encodes its row and writes it to fp immediately.
+        Otherwise formatted rows are collected until they reach buffer_size characters,
+        then they are encoded and written to fp in one call.
+        In buffered mode, flush() or close() must be called after the last row.
+
+        compression is None, 'infer', 'gzip', 'bz2' or 'xz', see open_compressed().
+        If compression is used, close() must be called to finish compressed stream.
+
+        If stats is CSVStats object, bytes, rows, format time and encode time are counted into it.
+        Without stats, no instrumentation code is put into writing path.
+        '''
+        self.compressed_stream = None
+        if compression is not None:
+            compressed_fp = open_compressed(fp, compression)
+            if compressed_fp is not fp:
+                self.compressed_stream = compressed_fp
+                fp = compressed_fp
         if sys.version_info[0] < 3:
             self.queue = io.BytesIO()
         else:
@@ -122,26 +606,565 @@ class CSVUnicodeWriter(object):
         self.writer = csv.writer(self.queue, dialect=dialect, **kwargs)
         self.stream = fp
         self.encoder = codecs.getincrementalencoder(encoding)()
+        self.buffer_size = buffer_size
+        self.stats = stats
+        if stats is not None:
+            self.__untimed_writerow = self.writerow
+            self.__untimed_writerows_batch = self.writerows_batch
+            self.writerow = self.__timed_writerow
+            self.writerows_batch = self.__timed_writerows_batch
 
     @property
     def dialect(self):
         return self.writer.dialect
 
-    def writerow(self, row):
-        if sys.version_info[0] < 3:
-            row = list(map(lambda item: item.encode('utf-8'), row))
-        self.writer.writerow(row)
+    def __write_queue(self):
         data = self.queue.getvalue()
+        if len(data) == 0:
+            return
         if sys.version_info[0] < 3:
             data = data.decode('utf-8')
-        data = self.encoder.encode(data)
-        self.stream.write(data)
+        if self.stats is None:
+            data = self.encoder.encode(data)
+            self.stream.write(data)
+        else:
+            start_time = timeit.default_timer()
+            data = self.encoder.encode(data)
+            self.stream.write(data)
+            self.stats.encode_time += timeit.default_timer()-start_time
+            self.stats.bytes_written += len(data)
         self.queue.seek(0)
         self.queue.truncate(0)
 
+    def __write_queue_if_full(self):
+        if self.buffer_size is None or self.queue.tell() >= self.buffer_size:
+            self.__write_queue()
+
+    def writerow(self, row):
+        if sys.version_info[0] < 3:
+            row = list(map(lambda item: item.encode('utf-8'), row))
+        self.writer.writerow(row)
+        self.__write_queue_if_full()
+
+    def writerows_batch(self, rows):
+        '''Format whole batch of rows at once, then encode and write it in one call unless buffered.'''
+        if sys.version_info[0] < 3:
+            rows = [list(map(lambda item: item.encode('utf-8'), row)) for row in rows]
+        self.writer.writerows(rows)
+        self.__write_queue_if_full()
+
+    def __timed_write(self, write_func, rows, row_count):
+        stats = self.stats
+        start_time = timeit.default_timer()
+        encode_time = stats.encode_time
+        write_func(rows)
+        now = timeit.default_timer()
+        stats.format_time += (now-start_time)-(stats.encode_time-encode_time)
+        stats.rows_written += row_count
+        stats.report_progress(now)
+
+    def __timed_writerow(self, row):
+        self.__timed_write(self.__untimed_writerow, row, 1)
+
+    def __timed_writerows_batch(self, rows):
+        self.__timed_write(self.__untimed_writerows_batch, rows, len(rows))
+
     def writerows(self, rows):
-        for row in rows:
-            self.writerow(row)
+        row_iter = iter(rows)
+        while True:
+            row_list = list(itertools.islice(row_iter, WRITEROWS_BATCH_SIZE))
+            if len(row_list) == 0:
+                break
+            self.writerows_batch(row_list)
+
+    def flush(self):
+        '''Encode and write all buffered rows to fp, then flush fp.'''
+        self.__write_queue()
+        if callable(getattr(self.stream, 'flush', None)):
+            self.stream.flush()
+
+    def close(self):
+        '''Flush buffered rows and finish compressed stream. fp is not closed.'''
+        self.flush()
+        if self.compressed_stream is not None:
+            self.compressed_stream.close()
+            self.compressed_stream = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+RECORD_BOUNDARY_SCAN_SIZE = 64*1024
+
+
+def _get_quote_byte(dialect, encoding, **kwargs):
+    effective_dialect = csv.reader([], dialect=dialect, **kwargs).dialect
+    if u'"\n'.encode(encoding) != b'"\n':
+        raise ValueError('encoding %s is not ASCII compatible' % (encoding,))
+    if effective_dialect.quoting == csv.QUOTE_NONE or effective_dialect.quotechar is None:
+        return None
+    quote_byte = effective_dialect.quotechar.encode(encoding)
+    if len(quote_byte) != 1:
+        raise ValueError('quotechar %s is not single byte in encoding %s' % (repr(effective_dialect.quotechar), encoding))
+    return quote_byte
+
+
+def _count_quote_in_range(path, start, end, quote_byte):
+    quote_count = 0
+    with open(path, 'rb') as fp:
+        fp.seek(start)
+        rest_size = end-start
+        while rest_size > 0:
+            block = fp.read(min(rest_size, RECORD_BOUNDARY_SCAN_SIZE*16))
+            if len(block) == 0:
+                break
+            quote_count += block.count(quote_byte)
+            rest_size -= len(block)
+    return quote_count
+
+
+def _count_quote_in_range_star(args):
+    return _count_quote_in_range(*args)
+
+
+def _find_record_boundary(fp, offset, is_quoted, quote_byte, file_size):
+    '''Find first record boundary at or after offset.
+    is_quoted tells whether offset is inside quoted field, which is decided by parity of quotes before offset.
+    Escaped quote is doubled quote in csv.excel dialect, so it never changes the parity.
+    '''
+    if offset <= 0:
+        return 0
+    if offset >= file_size:
+        return file_size
+    fp.seek(offset-1)
+    if fp.read(1) == b'\n' and not is_quoted:
+        return offset
+    position = offset
+    while True:
+        block = fp.read(RECORD_BOUNDARY_SCAN_SIZE)
+        if len(block) == 0:
+            return file_size
+        i = 0
+        while True:
+            if is_quoted:
+                quote_position = block.find(quote_byte, i)
+                if quote_position < 0:
+                    break
+                is_quoted = False
+                i = quote_position+1
+            else:
+                newline_position = block.find(b'\n', i)
+                quote_position = block.find(quote_byte, i) if quote_byte is not None else -1
+                if newline_position >= 0 and (quote_position < 0 or newline_position < quote_position):
+                    return position+newline_position+1
+                if quote_position < 0:
+                    break
+                is_quoted = True
+                i = quote_position+1
+        position += len(block)
+
+
+def _parse_csv_range(index, path, raw_start, raw_end, is_start_quoted, is_end_quoted, quote_byte, file_size, dialect, encoding, kwargs):
+    try:
+        with open(path, 'rb') as fp:
+            start = _find_record_boundary(fp, raw_start, is_start_quoted, quote_byte, file_size)
+            end = _find_record_boundary(fp, raw_end, is_end_quoted, quote_byte, file_size)
+            if start >= end:
+                return (index, True, [])
+            fp.seek(start)
+            data = fp.read(end-start)
+        rows = list(CSVUnicodeReader(io.BytesIO(data), dialect=dialect, encoding=encoding, fast=True, **kwargs))
+    except Exception as e:
+        return (index, False, e)
+    return (index, True, rows)
+
+
+class CSVParallelReader(object):
+    '''Parse huge csv file with multiple processes.
+    File is split into byte ranges of chunk_size, and every range is moved to record boundary and parsed in process pool.
+    Record boundary is found by parity of quote characters, so newline inside quoted field is handled.
+    It assumes csv.excel like dialect: quote character inside field is escaped by doubling,
+    and quote character appears only in quoted field.
+    Encoding must be ASCII compatible (UTF-8, Shift-JIS, Big5-HKSCS, ...), UTF-16/32 are not supported.
+    Quote characters of whole file are counted in advance, so file is read twice.
+    '''
+    DEFAULT_CHUNK_SIZE = 64*1024*1024
+
+    def __init__(self, path, dialect=csv.excel, encoding='utf-8', processes=None, chunk_size=DEFAULT_CHUNK_SIZE, **kwargs):
+        self.path = path
+        self.dialect = dialect
+        self.encoding = encoding
+        self.processes = processes if processes is not None else multiprocessing.cpu_count()
+        self.chunk_size = chunk_size
+        self.kwargs = kwargs
+        self.quote_byte = _get_quote_byte(dialect, encoding, **kwargs)
+
+    def __iter_range_task(self, pool):
+        file_size = os.path.getsize(self.path)
+        raw_start_list = list(range(0, file_size, self.chunk_size))+[file_size]
+        if self.quote_byte is None:
+            quote_count_list = [0]*(len(raw_start_list)-1)
+        else:
+            quote_count_list = pool.map(_count_quote_in_range_star, [(self.path, raw_start_list[i], raw_start_list[i+1], self.quote_byte) for i in range(len(raw_start_list)-1)])
+        is_quoted_list = [False]
+        for quote_count in quote_count_list:
+            is_quoted_list.append(is_quoted_list[-1] != bool(quote_count&0x1))
+        for i in range(len(raw_start_list)-1):
+            yield (i, self.path, raw_start_list[i], raw_start_list[i+1], is_quoted_list[i], is_quoted_list[i+1], self.quote_byte, file_size, self.dialect, self.encoding, self.kwargs)
+
+    def iter_batches(self, ordered=True):
+        '''Yield list of rows of every byte range.
+        If ordered is False, batches are yielded as soon as they are parsed.
+        At most 2 batches per process are parsed ahead, so memory usage is bounded.
+        '''
+        pool = multiprocessing.Pool(self.processes)
+        try:
+            result_queue = queue.Queue()
+            task_iter = self.__iter_range_task(pool)
+            window = self.processes*2
+            submitted_count = 0
+            yielded_count = 0
+            ready_batch_dict = {}
+            is_task_exhausted = False
+            while True:
+                while not is_task_exhausted and submitted_count-yielded_count < window:
+                    task = next(task_iter, None)
+                    if task is None:
+                        is_task_exhausted = True
+                        break
+                    pool.apply_async(_parse_csv_range, task, callback=result_queue.put)
+                    submitted_count += 1
+                if yielded_count == submitted_count:
+                    break
+                (index, is_successful, result) = result_queue.get()
+                if not is_successful:
+                    raise result
+                if ordered:
+                    ready_batch_dict[index] = result
+                    while yielded_count in ready_batch_dict:
+                        batch = ready_batch_dict.pop(yielded_count)
+                        yielded_count += 1
+                        yield batch
+                else:
+                    yielded_count += 1
+                    yield result
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.iter_batches())
+
+
+ARRAY_FLOAT_TYPECODES = 'fd'
+ARRAY_INT_TYPECODES = 'bBhHiIlLqQ'
+
+
+class CSVColumnarReader(object):
+    '''Read selected columns of csv into typed arrays, chunk by chunk.
+    schema is list of (column, type) or (column, type, converter).
+    column is column index, or header name if header is True.
+    type is array.array typecode, or numpy dtype if use_numpy is True.
+    Every iteration yields collections.OrderedDict which maps column to array of at most chunk_size items.
+    Rows are projected to selected columns as soon as they are parsed,
+    so only one chunk of string cells of selected columns exists at the same time.
+    Empty cell is replaced with fill_value if it is not None, otherwise it raises ValueError.
+    '''
+    DEFAULT_CHUNK_SIZE = 8192
+
+    def __init__(self, fp, schema, dialect=csv.excel, encoding='utf-8', chunk_size=DEFAULT_CHUNK_SIZE, header=False, use_numpy=False, fill_value=None, **kwargs):
+        if use_numpy and numpy is None:
+            raise ImportError('numpy is not installed')
+        self.reader = CSVUnicodeReader(fp, dialect=dialect, encoding=encoding, fast=True, **kwargs)
+        row_iter = iter(self.reader)
+        self.header = next(row_iter) if header else None
+        self.chunk_size = chunk_size
+        self.use_numpy = use_numpy
+        column_index_list = []
+        self.column_spec_list = []
+        for column_schema in schema:
+            (column, column_type) = column_schema[:2]
+            converter = column_schema[2] if len(column_schema) > 2 else self.__get_default_converter(column_type)
+            if fill_value is not None:
+                converter = self.__fill_empty(converter, fill_value)
+            column_index = self.__get_column_index(column)
+            if column_index not in column_index_list:
+                column_index_list.append(column_index)
+            # position of column in projected row
+            self.column_spec_list.append((column, column_index_list.index(column_index), column_type, converter))
+        if len(column_index_list) == 1:
+            row_iter = imap(lambda row, column_index=column_index_list[0]: (row[column_index],), row_iter)
+        else:
+            row_iter = imap(operator.itemgetter(*column_index_list), row_iter)
+        self.row_iter = row_iter
+
+    def __get_column_index(self, column):
+        if isinstance(column, int):
+            return column
+        if self.header is None:
+            raise ValueError('column name %s requires header' % (repr(column),))
+        return self.header.index(column)
+
+    def __get_default_converter(self, column_type):
+        if self.use_numpy:
+            kind = numpy.dtype(column_type).kind
+            if kind in 'fc':
+                return float
+            if kind in 'iu':
+                return int
+        else:
+            if column_type in ARRAY_FLOAT_TYPECODES:
+                return float
+            if column_type in ARRAY_INT_TYPECODES:
+                return int
+        raise ValueError('unsupported column type %s' % (repr(column_type),))
+
+    @staticmethod
+    def __fill_empty(converter, fill_value):
+        def fill_empty_converter(item):
+            if len(item) == 0:
+                return fill_value
+            return converter(item)
+        return fill_empty_converter
+
+    @property
+    def dialect(self):
+        return self.reader.dialect
+
+    @property
+    def line_num(self):
+        return self.reader.line_num
+
+    def __make_column(self, column_type, value_iter, row_count):
+        if self.use_numpy:
+            return numpy.fromiter(value_iter, dtype=column_type, count=row_count)
+        return array.array(column_type, value_iter)
+
+    def __next_chunk_generator(self):
+        while True:
+            rows = list(itertools.islice(self.row_iter, self.chunk_size))
+            if len(rows) == 0:
+                break
+            row_count = len(rows)
+            chunk = collections.OrderedDict()
+            for (column, column_index, column_type, converter) in self.column_spec_list:
+                chunk[column] = self.__make_column(column_type, map(converter, map(operator.itemgetter(column_index), rows)), row_count)
+            del rows
+            yield chunk
+
+    def __iter__(self):
+        return self.__next_chunk_generator()
+
+    def read_all(self):
+        '''Read rest of csv and return collections.OrderedDict which maps column to one array.'''
+        column_list_dict = collections.OrderedDict((column_spec[0], []) for column_spec in self.column_spec_list)
+        for chunk in self:
+            for (column, column_array) in chunk.items():
+                column_list_dict[column].append(column_array)
+        result = collections.OrderedDict()
+        for (column, column_index, column_type, converter) in self.column_spec_list:
+            column_array_list = column_list_dict[column]
+            if self.use_numpy:
+                result[column] = numpy.concatenate(column_array_list) if len(column_array_list) > 0 else numpy.empty(0, dtype=column_type)
+            else:
+                result[column] = array.array(column_type)
+                for column_array in column_array_list:
+                    result[column].extend(column_array)
+        return result
+
+
+class MmapReader(io.RawIOBase):
+    '''Raw reader of mmap from offset, every reader keeps its own position.'''
+    def __init__(self, mapped, offset=0):
+        self.mapped = mapped
+        self.position = offset
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = self.mapped[self.position:self.position+len(b)]
+        b[:len(data)] = data
+        self.position += len(data)
+        return len(data)
+
+
+def _iter_decoded_line_with_offset(fp, encoding, offset_list):
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for line in fp:
+        offset_list[0] += len(line)
+        line = decoder.decode(line)
+        if sys.version_info[0] < 3:
+            line = line.encode('utf-8')
+        yield line
+
+
+class CSVRowIndex(object):
+    '''Byte offset and line_num of every interval-th record of csv file.
+    Record 0 is the first record of file, including header.
+    Index remembers size and mtime of indexed file, so stale index can be detected.
+    '''
+    MAGIC = b'CSVIDX01'
+    HEADER_STRUCT = struct.Struct('<QQQd')
+    DEFAULT_INTERVAL = 1000
+
+    def __init__(self, interval, offset_array, line_num_array, row_count, file_size, file_mtime):
+        self.interval = interval
+        self.offset_array = offset_array
+        self.line_num_array = line_num_array
+        self.row_count = row_count
+        self.file_size = file_size
+        self.file_mtime = file_mtime
+
+    @staticmethod
+    def index_path(path):
+        return path+'.idx'
+
+    @classmethod
+    def build(cls, path, interval=DEFAULT_INTERVAL, dialect=csv.excel, encoding='utf-8', **kwargs):
+        _get_quote_byte(dialect, encoding, **kwargs)
+        offset_array = array.array('Q', [0])
+        line_num_array = array.array('Q', [0])
+        offset_list = [0]
+        row_count = 0
+        file_stat = os.stat(path)
+        with open(path, 'rb') as fp:
+            # csv.reader pulls exactly the lines of one record, so consumed offset is the start of next record
+            reader = csv.reader(_iter_decoded_line_with_offset(fp, encoding, offset_list), dialect=dialect, **kwargs)
+            for row in reader:
+                row_count += 1
+                if row_count%interval == 0:
+                    offset_array.append(offset_list[0])
+                    line_num_array.append(reader.line_num)
+        if row_count > 0 and row_count%interval == 0:
+            # no record starts at the end of file
+            offset_array.pop()
+            line_num_array.pop()
+        return cls(interval, offset_array, line_num_array, row_count, file_stat.st_size, file_stat.st_mtime)
+
+    def is_valid_for(self, path):
+        file_stat = os.stat(path)
+        return file_stat.st_size == self.file_size and file_stat.st_mtime == self.file_mtime
+
+    def locate(self, row):
+        '''Return (offset, line_num, skip): byte offset and line_num of nearest indexed record, and records to skip from it.'''
+        entry = min(row//self.interval, len(self.offset_array)-1)
+        return (self.offset_array[entry], self.line_num_array[entry], row-entry*self.interval)
+
+    def save(self, index_path):
+        offset_array = array.array('Q', self.offset_array)
+        line_num_array = array.array('Q', self.line_num_array)
+        if sys.byteorder == 'big':
+            offset_array.byteswap()
+            line_num_array.byteswap()
+        with open(index_path, 'wb') as fp:
+            fp.write(self.MAGIC)
+            fp.write(self.HEADER_STRUCT.pack(self.interval, self.row_count, self.file_size, self.file_mtime))
+            fp.write(struct.pack('<Q', len(offset_array)))
+            offset_array.tofile(fp)
+            line_num_array.tofile(fp)
+
+    @classmethod
+    def load(cls, index_path):
+        with open(index_path, 'rb') as fp:
+            if fp.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError('%s is not csv row index' % (index_path,))
+            (interval, row_count, file_size, file_mtime) = cls.HEADER_STRUCT.unpack(fp.read(cls.HEADER_STRUCT.size))
+            (entry_count,) = struct.unpack('<Q', fp.read(8))
+            offset_array = array.array('Q')
+            offset_array.fromfile(fp, entry_count)
+            line_num_array = array.array('Q')
+            line_num_array.fromfile(fp, entry_count)
+        if sys.byteorder == 'big':
+            offset_array.byteswap()
+            line_num_array.byteswap()
+        return cls(interval, offset_array, line_num_array, row_count, file_size, file_mtime)
+
+
+class CSVIndexedReader(object):
+    '''Random access reader of csv file by record number.
+    Row index is kept in sidecar file path+'.idx', it is built when it does not exist or is stale.
+    File is mmapped, and every read seeks to nearest indexed record and skips at most interval-1 records.
+    line_num is line number of the last returned record in the whole file, as CSVUnicodeReader.line_num.
+    '''
+    def __init__(self, path, interval=CSVRowIndex.DEFAULT_INTERVAL, dialect=csv.excel, encoding='utf-8', save_index=True, **kwargs):
+        self.path = path
+        self.dialect = dialect
+        self.encoding = encoding
+        self.kwargs = kwargs
+        self.index = self.__load_or_build_index(interval, save_index)
+        self.fp = open(path, 'rb')
+        if self.index.file_size > 0:
+            self.mapped = mmap.mmap(self.fp.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.mapped = b''
+        self.__reader = None
+        self.__base_line_num = 0
+
+    def __load_or_build_index(self, interval, save_index):
+        index_path = CSVRowIndex.index_path(self.path)
+        try:
+            index = CSVRowIndex.load(index_path)
+        except (IOError, OSError, ValueError, EOFError, struct.error):
+            index = None
+        if index is not None and index.interval == interval and index.is_valid_for(self.path):
+            return index
+        index = CSVRowIndex.build(self.path, interval, self.dialect, self.encoding, **self.kwargs)
+        if save_index:
+            try:
+                index.save(index_path)
+            except (IOError, OSError):
+                pass
+        return index
+
+    def __len__(self):
+        return self.index.row_count
+
+    @property
+    def line_num(self):
+        if self.__reader is None:
+            return self.__base_line_num
+        return self.__base_line_num+self.__reader.line_num
+
+    def iter_rows(self, start, stop=None):
+        '''Iterate records from record number start to stop.'''
+        if stop is None:
+            stop = self.index.row_count
+        if start >= stop or start >= self.index.row_count:
+            return iter(())
+        (offset, base_line_num, skip) = self.index.locate(start)
+        reader = CSVUnicodeReader(io.BufferedReader(MmapReader(self.mapped, offset)), dialect=self.dialect, encoding=self.encoding, fast=True, **self.kwargs)
+        self.__reader = reader
+        self.__base_line_num = base_line_num
+        return itertools.islice(iter(reader), skip, skip+stop-start)
+
+    def read_rows(self, start, stop):
+        return list(self.iter_rows(start, stop))
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            (start, stop, step) = row.indices(self.index.row_count)
+            return list(itertools.islice(self.iter_rows(start, stop), 0, None, step))
+        if row < 0:
+            row += self.index.row_count
+        if not 0 <= row < self.index.row_count:
+            raise IndexError('csv row out of range')
+        return next(self.iter_rows(row, row+1))
+
+    def close(self):
+        self.__reader = None
+        if isinstance(self.mapped, mmap.mmap):
+            self.mapped.close()
+        self.fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
 
 # test case
@@ -170,29 +1193,32 @@ class CSVUnicodeTestCase(unittest.TestCase):
             status = callable(getattr(obj, '__next__', None)) and not hasattr(obj, 'next')
         return status
 
-    def __check_attr(self, encoding):
+    def __check_attr(self, encoding, fast=False):
         with open(self.__TEST_FILE, 'rb') as fp:
             recoder = UTF8Recoder(fp, encoding)
             self.assertTrue(self.__is_iterable(recoder), 'UTF8Recoder is not iterable')
             self.assertTrue(self.__is_iterator(iter(recoder)), 'iter(UTF8Recoder) is not iterator')
         with open(self.__TEST_FILE, 'rb') as fp:
-            csv_reader = CSVUnicodeReader(fp, encoding=encoding)
+            csv_reader = CSVUnicodeReader(fp, encoding=encoding, fast=fast)
             self.assertTrue(self.__is_iterable(csv_reader), 'CSVUnicodeReader is not iterable')
             self.assertTrue(self.__is_iterator(iter(csv_reader)), 'iter(CSVUnicodeReader) is not iterator')
 
-    def __write_csv(self, encoding, use_writerows):
+    def __write_csv(self, encoding, use_writerows, buffer_size=None):
         with open(self.__TEST_FILE, 'wb') as fp:
-            csv_writer = CSVUnicodeWriter(fp, encoding=encoding)
+            csv_writer = CSVUnicodeWriter(fp, encoding=encoding, buffer_size=buffer_size)
             print(repr(csv_writer.dialect))
             if bool(use_writerows):
                 csv_writer.writerows(self.__TEST_DATA)
             else:
                 for row in self.__TEST_DATA:
                     csv_writer.writerow(row)
+            csv_writer.flush()
 
-    def __read_csv(self, encoding):
+    def __read_csv(self, encoding, fast=False, expected_encoding=None):
         with open(self.__TEST_FILE, 'rb') as fp:
-            csv_reader = CSVUnicodeReader(fp, encoding=encoding)
+            csv_reader = CSVUnicodeReader(fp, encoding=encoding, fast=fast)
+            if expected_encoding is not None:
+                self.assertEqual(codecs.lookup(csv_reader.encoding).name, codecs.lookup(expected_encoding).name, 'encoding is not detected')
             print(repr(csv_reader.dialect))
             i = 0
             self.assertEqual(csv_reader.line_num, i, 'line_num is wrong')
@@ -211,6 +1237,14 @@ class CSVUnicodeTestCase(unittest.TestCase):
         self.__write_csv(encoding, True)
         self.__read_csv(encoding)
         self.__check_attr(encoding)
+        self.__read_csv(encoding, True)
+        self.__check_attr(encoding, True)
+        self.__read_csv('auto', False, encoding)
+        for buffer_size in (1, 4096):
+            self.__write_csv(encoding, False, buffer_size)
+            self.__read_csv(encoding)
+            self.__write_csv(encoding, True, buffer_size)
+            self.__read_csv(encoding)
 
     def test_codec_utf_8(self):
         self.__test_one_codec('utf-8')
@@ -221,6 +1255,198 @@ class CSVUnicodeTestCase(unittest.TestCase):
     def _test_codec_big5hkscs(self):
         self.__test_one_codec('big5hkscs')
 
+    def test_buffered_writer(self):
+        fp = io.BytesIO()
+        with CSVUnicodeWriter(fp, buffer_size=4096) as csv_writer:
+            csv_writer.writerow(self.__TEST_DATA[0])
+            self.assertEqual(fp.getvalue(), b'', 'buffered row is written too early')
+            csv_writer.writerows(iter(self.__TEST_DATA*1000))
+        self.assertEqual(list(CSVUnicodeReader(io.BytesIO(fp.getvalue()))), self.__TEST_DATA[:1]+self.__TEST_DATA*1000)
+
+    def test_parallel_reader(self):
+        data = []
+        for i in range(500):
+            data.append([u'%d' % (i,), u'line\r\nbreak "%d"' % (i,) if i%3 == 0 else u'\u96fb\u8eca', u'"' if i%7 == 0 else u'', u'x'*(i%50)])
+        with open(self.__TEST_FILE, 'wb') as fp:
+            CSVUnicodeWriter(fp).writerows(data)
+        for chunk_size in (37, 1024, 1024*1024):
+            csv_reader = CSVParallelReader(self.__TEST_FILE, processes=2, chunk_size=chunk_size)
+            self.assertEqual(list(csv_reader), data, 'parallel reader result is wrong')
+            self.assertEqual(sorted(itertools.chain.from_iterable(csv_reader.iter_batches(ordered=False)), key=lambda row: int(row[0])), data)
+
+    def test_columnar_reader(self):
+        fp = io.BytesIO(u'name,speed,wheel\r\n\u96fb\u8eca,320.0,16\r\ncar,250.5,4\r\nbike,,2\r\n'.encode('utf-8'))
+        csv_reader = CSVColumnarReader(fp, [('speed', 'd'), (2, 'q')], chunk_size=2, header=True, fill_value=-1.0)
+        self.assertEqual(csv_reader.header, [u'name', u'speed', u'wheel'])
+        chunk_list = list(csv_reader)
+        self.assertEqual(len(chunk_list), 2)
+        self.assertEqual(chunk_list[0]['speed'], array.array('d', [320.0, 250.5]))
+        self.assertEqual(chunk_list[1][2], array.array('q', [2]))
+        fp.seek(0)
+        columns = CSVColumnarReader(fp, [('speed', 'd'), ('wheel', 'i', lambda item: int(item)*10)], chunk_size=2, header=True, fill_value=0.0).read_all()
+        self.assertEqual(list(columns.keys()), ['speed', 'wheel'])
+        self.assertEqual(columns['speed'], array.array('d', [320.0, 250.5, 0.0]))
+        self.assertEqual(columns['wheel'], array.array('i', [160, 40, 20]))
+        fp.seek(0)
+        columns = CSVColumnarReader(fp, [(2, 'q')], chunk_size=2, header=True).read_all()
+        self.assertEqual(columns[2], array.array('q', [16, 4, 2]))
+
+    def test_columnar_reader_numpy(self):
+        if numpy is None:
+            self.skipTest('numpy is not installed')
+        fp = io.BytesIO(u'name,speed,wheel\r\n\u96fb\u8eca,320.0,16\r\ncar,250.5,4\r\nbike,,2\r\n'.encode('utf-8'))
+        csv_reader = CSVColumnarReader(fp, [('speed', 'float64'), ('wheel', 'int32')], chunk_size=2, header=True, use_numpy=True, fill_value=numpy.nan)
+        chunk_list = list(csv_reader)
+        self.assertEqual(len(chunk_list), 2)
+        self.assertEqual(chunk_list[0]['wheel'].dtype, numpy.dtype('int32'))
+        self.assertEqual(chunk_list[0]['wheel'].tolist(), [16, 4])
+        fp.seek(0)
+        columns = CSVColumnarReader(fp, [('speed', 'float64'), ('wheel', 'int32')], chunk_size=2, header=True, use_numpy=True, fill_value=numpy.nan).read_all()
+        self.assertEqual(columns['speed'].dtype, numpy.dtype('float64'))
+        self.assertEqual(columns['speed'][:2].tolist(), [320.0, 250.5])
+        self.assertTrue(numpy.isnan(columns['speed'][2]))
+        self.assertEqual(columns['wheel'].tolist(), [16, 4, 2])
+
+    def test_usecols_and_predicate(self):
+        csv_bytes = u'name,country,type,speed\r\n'.encode('utf-8')+b''.join(u','.join(row).encode('utf-8')+b'\r\n' for row in [[u'a', u'Japan', u'\u96fb\u8eca', u'320.0'], [u'b', u'', u'car', u'250.0']])
+        csv_reader = CSVUnicodeReader(io.BytesIO(csv_bytes), usecols=['speed', 0], use_namedtuple=True, predicate=lambda row: float(row.speed) > 300.0, fast=True)
+        self.assertEqual(csv_reader.header, [u'name', u'country', u'type', u'speed'])
+        row_list = list(csv_reader)
+        self.assertEqual(row_list, [(u'320.0', u'a')])
+        self.assertEqual(row_list[0].name, u'a')
+        self.assertEqual(csv_reader.line_num, 3, 'line_num is wrong')
+        csv_reader = CSVUnicodeReader(io.BytesIO(csv_bytes), usecols=[2])
+        self.assertTrue(self.__is_iterator(iter(csv_reader)), 'iter(CSVUnicodeReader) is not iterator')
+        self.assertEqual(list(csv_reader), [(u'type',), (u'\u96fb\u8eca',), (u'car',)])
+
+    def test_batches(self):
+        fp = io.BytesIO()
+        csv_writer = CSVUnicodeWriter(fp)
+        csv_writer.writerows_batch(self.__TEST_DATA*2)
+        csv_writer.writerows_batch(self.__TEST_DATA[:1])
+        csv_reader = CSVUnicodeReader(io.BytesIO(fp.getvalue()), fast=True)
+        self.assertEqual(list(csv_reader.iter_batches(2)), [self.__TEST_DATA, self.__TEST_DATA, self.__TEST_DATA[:1]])
+        self.assertEqual(csv_reader.line_num, 5, 'line_num is wrong')
+
+    def test_compression(self):
+        for compression in ('gzip', 'bz2', 'xz'):
+            fp = io.BytesIO()
+            with CSVUnicodeWriter(fp, compression=compression) as csv_writer:
+                csv_writer.writerows(self.__TEST_DATA*100)
+            self.assertFalse(fp.closed, 'compressed writer closed file')
+            for (fast, threaded) in ((False, False), (True, False), (True, True)):
+                with CSVUnicodeReader(io.BytesIO(fp.getvalue()), compression='infer', fast=fast, threaded=threaded) as csv_reader:
+                    self.assertEqual(list(csv_reader), self.__TEST_DATA*100, '%s is not decompressed' % (compression,))
+                    self.assertEqual(csv_reader.line_num, 200, 'line_num is wrong')
+            decompressed_fp = open_decompressed(io.BytesIO(fp.getvalue()), compression)
+            prefetch_reader = ThreadedPrefetchReader(decompressed_fp, block_size=16)
+            prefetch_reader.read(1)
+            prefetch_reader.close()
+            self.assertTrue(decompressed_fp.closed, 'decompressor is not closed')
+            with CSVUnicodeReader(io.BufferedReader(PrefixedReader(b'', io.BytesIO(fp.getvalue()))), compression='infer', threaded=True) as csv_reader:
+                self.assertEqual(next(iter(csv_reader)), self.__TEST_DATA[0])
+
+        compressed_file = self.__TEST_FILE+'.gz'
+        with open(compressed_file, 'wb') as fp:
+            with CSVUnicodeWriter(fp, compression='infer') as csv_writer:
+                csv_writer.writerows(self.__TEST_DATA)
+        with open(compressed_file, 'rb') as fp:
+            self.assertEqual(fp.read(2), b'\x1f\x8b', 'file is not gzip compressed')
+            fp.seek(0)
+            self.assertEqual(list(CSVUnicodeReader(fp, compression='infer')), self.__TEST_DATA)
+        with open(self.__TEST_FILE, 'wb') as fp:
+            CSVUnicodeWriter(fp, compression='infer').writerows(self.__TEST_DATA)
+        with open(self.__TEST_FILE, 'rb') as fp:
+            with CSVUnicodeReader(fp, compression='infer') as csv_reader:
+                self.assertEqual(list(csv_reader), self.__TEST_DATA)
+            self.assertFalse(fp.closed, 'reader closed uncompressed file')
+
+    def test_indexed_reader(self):
+        data = [[u'%d' % (i,), u'\u96fb\u8eca\r\n%d' % (i,) if i%4 == 0 else u'x', u'"q"'] for i in range(100)]
+        with open(self.__TEST_FILE, 'wb') as fp:
+            CSVUnicodeWriter(fp).writerows(data)
+        index_path = CSVRowIndex.index_path(self.__TEST_FILE)
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+        line_num_list = []
+        with open(self.__TEST_FILE, 'rb') as fp:
+            csv_reader = CSVUnicodeReader(fp)
+            for row in csv_reader:
+                line_num_list.append(csv_reader.line_num)
+
+        for i in range(2):
+            with CSVIndexedReader(self.__TEST_FILE, interval=7) as csv_reader:
+                self.assertTrue(os.path.exists(index_path), 'index is not saved')
+                self.assertEqual(len(csv_reader), len(data))
+                self.assertEqual(csv_reader.read_rows(20, 31), data[20:31])
+                self.assertEqual(csv_reader.line_num, line_num_list[30], 'line_num is wrong')
+                self.assertEqual(csv_reader[99], data[99])
+                self.assertEqual(csv_reader.line_num, line_num_list[99], 'line_num is wrong')
+                self.assertEqual(csv_reader[-100], data[0])
+                self.assertEqual(csv_reader[5:60:5], data[5:60:5])
+                self.assertEqual(csv_reader.read_rows(98, 200), data[98:])
+
+        with open(self.__TEST_FILE, 'wb') as fp:
+            CSVUnicodeWriter(fp).writerows(data[:10])
+        with CSVIndexedReader(self.__TEST_FILE, interval=7) as csv_reader:
+            self.assertEqual(len(csv_reader), 10, 'stale index is used')
+            self.assertEqual(csv_reader.read_rows(0, 100), data[:10])
+        os.remove(index_path)
+
+    def test_detect_encoding(self):
+        text_fp = io.StringIO(newline='')
+        csv.writer(text_fp).writerows(self.__TEST_DATA)
+        text = text_fp.getvalue()
+        for encoding in ('utf-8', 'shift-jis', 'big5hkscs'):
+            self.assertEqual(detect_encoding(io.BytesIO(text.encode(encoding)))[0], encoding)
+        self.assertEqual(detect_encoding(io.BytesIO(text.encode('utf-16')))[0], 'utf-16')
+        self.assertEqual(detect_encoding(io.BytesIO(codecs.BOM_UTF8+text.encode('utf-8')))[0], 'utf-8-sig')
+        self.assertEqual(detect_encoding(io.BytesIO(text.encode('utf-8')), sample_size=10)[0], 'utf-8')
+        csv_reader = CSVUnicodeReader(io.BytesIO(codecs.BOM_UTF8+text.encode('utf-8')), encoding='auto')
+        self.assertEqual(list(csv_reader), self.__TEST_DATA)
+
+        # compressed input from pipe, which can not seek
+        compressed_data = gzip.compress(text.encode('shift-jis'))
+        for compression in ('infer', 'gzip'):
+            for stats in (None, CSVStats()):
+                (read_fd, write_fd) = os.pipe()
+                with os.fdopen(write_fd, 'wb') as write_fp:
+                    write_fp.write(compressed_data)
+                with os.fdopen(read_fd, 'rb') as read_fp:
+                    with CSVUnicodeReader(read_fp, compression=compression, encoding='auto', stats=stats) as csv_reader:
+                        self.assertEqual(csv_reader.encoding, 'shift-jis')
+                        self.assertEqual(list(csv_reader), self.__TEST_DATA)
+
+    def test_stats(self):
+        progress_list = []
+        write_stats = CSVStats(progress_callback=progress_list.append, progress_interval=0.0)
+        fp = io.BytesIO()
+        csv_writer = CSVUnicodeWriter(fp, encoding='shift-jis', stats=write_stats)
+        csv_writer.writerow(self.__TEST_DATA[0])
+        csv_writer.writerows(self.__TEST_DATA*10)
+        self.assertEqual(write_stats.rows_written, 21)
+        self.assertEqual(write_stats.bytes_written, len(fp.getvalue()))
+        self.assertTrue(write_stats.format_time > 0.0 and write_stats.encode_time > 0.0, 'time is not measured')
+        self.assertEqual(len(progress_list), 2, 'progress callback is not called')
+
+        for fast in (False, True):
+            read_stats = CSVStats()
+            csv_reader = CSVUnicodeReader(io.BytesIO(fp.getvalue()), encoding='shift-jis', fast=fast, usecols=[0], stats=read_stats)
+            self.assertEqual(len(list(csv_reader)), 21)
+            self.assertEqual(read_stats.rows_read, 21)
+            self.assertEqual(read_stats.bytes_read, len(fp.getvalue()))
+            self.assertTrue(read_stats.decode_time > 0.0 and read_stats.parse_time > 0.0, 'time is not measured')
+            print(repr(read_stats))
+
+    def test_fast_reader_keeps_file_open(self):
+        fp = io.BytesIO(u'a,"b\r\nc"\r\nd,e\r\n'.encode('utf-8'))
+        csv_reader = CSVUnicodeReader(fp, fast=True)
+        self.assertEqual(list(csv_reader), [[u'a', u'b\r\nc'], [u'd', u'e']])
+        self.assertEqual(csv_reader.line_num, 3, 'line_num is wrong')
+        del csv_reader
+        self.assertFalse(fp.closed, 'fast reader closed file')
+
 
 if __name__ == '__main__':
     unittest.main()
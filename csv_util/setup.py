@@ -34,5 +34,5 @@ setup(name='csv_util',
     author='Himawari Tachibana',
     author_email='fieliapm@gmail.com',
     url='https://github.com/fieliapm/python_util',
-    py_modules=['csv_util'],
+    py_modules=['csv_util', 'async_csv_util'],
 )
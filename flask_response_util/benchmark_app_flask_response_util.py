@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+################################################################################
+#
+# flask_response_util - flask response utility
+# Copyright (C) 2016-present Himawari Tachibana <fieliapm@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+
+
+# benchmark of flask_response_util decorators driving a sample flask app through test client
+# usage: python benchmark_app_flask_response_util.py [-n request_count] [--json result.json] [--baseline baseline.json] [--tolerance 0.2]
+# exit status is 1 if any case regresses from baseline, so that it can be run in CI
+
+
+import sys
+import json
+import time
+import argparse
+
+import flask
+
+import flask_response_util
+
+
+BODY = u'{"items": [%s]}' % (u', '.join(u'{"id": %d, "name": "item %d"}' % (i, i) for i in range(100)),)
+
+
+def make_app():
+    app = flask.Flask(__name__)
+
+    def add_view(rule, endpoint, view):
+        app.add_url_rule(rule, endpoint, view)
+
+    def plain_view():
+        return flask.Response(BODY, mimetype='application/json')
+
+    add_view('/plain', 'plain', plain_view)
+    add_view('/template_response_headers', 'template_response_headers', flask_response_util.template_response_headers({'X-Frame-Options': 'DENY'})(plain_view))
+    add_view('/cache_control', 'cache_control', flask_response_util.cache_control(10)(plain_view))
+    add_view('/cache_control_timing', 'cache_control_timing', flask_response_util.cache_control(10, timing=flask_response_util.TimingRegistry())(plain_view))
+    add_view('/cached', 'cached', flask_response_util.cached_response(10)(plain_view))
+    add_view('/compressed', 'compressed', flask_response_util.cache_control(10)(flask_response_util.compress_response()(plain_view)))
+    add_view('/conditional', 'conditional', flask_response_util.cache_control(10)(flask_response_util.conditional_response()(plain_view)))
+    return app
+
+
+# (name, path, request headers)
+CASE_LIST = [
+    ('plain', '/plain', {}),
+    ('template_response_headers', '/template_response_headers', {}),
+    ('cache_control', '/cache_control', {}),
+    ('cache_control(timing)', '/cache_control_timing', {}),
+    ('cached_response', '/cached', {}),
+    ('compress_response', '/compressed', {'Accept-Encoding': 'gzip'}),
+    ('conditional_response(200)', '/conditional', {}),
+    ('conditional_response(304)', '/conditional', {'If-None-Match': '"%s"'}),
+]
+
+
+def percentile(sorted_latency_list, ratio):
+    index = min(int(len(sorted_latency_list)*ratio), len(sorted_latency_list)-1)
+    return sorted_latency_list[index]
+
+
+def run_case(client, path, headers, request_count, warmup_count):
+    for i in range(warmup_count):
+        client.get(path, headers=headers).close()
+    latency_list = []
+    start_time = time.perf_counter()
+    for i in range(request_count):
+        request_start_time = time.perf_counter()
+        response = client.get(path, headers=headers)
+        response.get_data()
+        response.close()
+        latency_list.append(time.perf_counter()-request_start_time)
+    duration = time.perf_counter()-start_time
+    latency_list.sort()
+    return {
+        'requests_per_second': request_count/duration,
+        'p50_ms': percentile(latency_list, 0.5)*1000.0,
+        'p99_ms': percentile(latency_list, 0.99)*1000.0,
+    }
+
+
+def run_benchmark(request_count, warmup_count):
+    client = make_app().test_client()
+    etag = client.get('/conditional').headers['ETag'].strip('"')
+    result = {}
+    for (name, path, headers) in CASE_LIST:
+        headers = dict((header, value % (etag,) if '%s' in value else value) for (header, value) in headers.items())
+        result[name] = run_case(client, path, headers, request_count, warmup_count)
+    return result
+
+
+def find_regression(result, baseline, tolerance):
+    '''Return list of message of case which is slower than baseline by more than tolerance ratio.'''
+    message_list = []
+    for (name, case_result) in result.items():
+        case_baseline = baseline.get(name)
+        if case_baseline is None:
+            continue
+        if case_result['requests_per_second'] < case_baseline['requests_per_second']*(1.0-tolerance):
+            message_list.append('%s: %.0f req/s < baseline %.0f req/s' % (name, case_result['requests_per_second'], case_baseline['requests_per_second']))
+        if case_result['p50_ms'] > case_baseline['p50_ms']*(1.0+tolerance):
+            message_list.append('%s: p50 %.3f ms > baseline %.3f ms' % (name, case_result['p50_ms'], case_baseline['p50_ms']))
+    return message_list
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='benchmark of flask_response_util decorators')
+    parser.add_argument('-n', '--request-count', type=int, default=5000)
+    parser.add_argument('--warmup-count', type=int, default=200)
+    parser.add_argument('--json', help='write result to this JSON file, which can be used as baseline later')
+    parser.add_argument('--baseline', help='compare result with this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown ratio from baseline')
+    args = parser.parse_args(argv[1:])
+
+    result = run_benchmark(args.request_count, args.warmup_count)
+    for (name, path, headers) in CASE_LIST:
+        case_result = result[name]
+        print('%-30s %10.0f req/s   p50 %8.3f ms   p99 %8.3f ms' % (name, case_result['requests_per_second'], case_result['p50_ms'], case_result['p99_ms']))
+
+    if args.json is not None:
+        with open(args.json, 'w') as fp:
+            json.dump(result, fp, indent=2, sort_keys=True)
+
+    if args.baseline is not None:
+        with open(args.baseline, 'r') as fp:
+            baseline = json.load(fp)
+        message_list = find_regression(result, baseline, args.tolerance)
+        for message in message_list:
+            print('REGRESSION %s' % (message,))
+        if message_list:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+################################################################################
+#
+# flask_response_util - flask response utility
+# Copyright (C) 2016-present Himawari Tachibana <fieliapm@gmail.com>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+#
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+################################################################################
+
+
+# microbenchmark of decorator overhead per request of flask_response_util
+# usage: python benchmark_flask_response_util.py [request_count]
+
+
+import sys
+import time
+import timeit
+
+import flask
+import werkzeug.http
+
+import flask_response_util
+
+
+def report(name, count, duration):
+    print('%-40s %10.2f us/call %12.0f calls/s' % (name, duration*1000000.0/count, count/duration))
+
+
+def measure(name, func, count):
+    start_time = timeit.default_timer()
+    for i in range(count):
+        func()
+    report(name, count, timeit.default_timer()-start_time)
+
+
+def plain_view():
+    return 'OK'
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 100000
+
+    now = time.time()
+    measure('werkzeug.http.http_date', lambda: werkzeug.http.http_date(now), count)
+    measure('cached_http_date', lambda: flask_response_util.cached_http_date(now), count)
+
+    app = flask.Flask(__name__)
+    view_list = [
+        ('plain view', lambda: flask.make_response(plain_view())),
+        ('template_response_headers', flask_response_util.template_response_headers({'X-Frame-Options': 'DENY', 'X-Content-Type-Options': 'nosniff'})(plain_view)),
+        ('cache_control', flask_response_util.cache_control(10)(plain_view)),
+        ('cache_control(timing)', flask_response_util.cache_control(10, timing=flask_response_util.TimingRegistry())(plain_view)),
+    ]
+    # views are called directly inside one request context, so that only decorator overhead is measured
+    with app.test_request_context('/'):
+        for (name, view) in view_list:
+            measure(name, view, count)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
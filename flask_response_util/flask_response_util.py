@@ -25,10 +25,23 @@
 
 import math
 import time
+import io
+import os
+import csv
+import codecs
+import bisect
+import json
+import hashlib
+import gzip
+import zlib
+import threading
+import inspect
+import collections
 from functools import wraps
 
 import flask
 import werkzeug.http
+import werkzeug.wsgi
 
 
 def fractional_part(x):
@@ -39,6 +52,119 @@ def round_maxage(current_unix_timestamp, second):
     return max(int(math.floor(fractional_part(current_unix_timestamp)+second)), 0)
 
 
+class HTTPDateCache(object):
+    '''Format HTTP date of UNIX timestamp, and reuse formatted string within the same second.
+    Latest (second, HTTP date) pair is replaced as a whole, so it is safe to share it between threads.
+    '''
+    def __init__(self):
+        self.__latest = (None, None)
+
+    def __call__(self, unix_timestamp):
+        second = int(math.floor(unix_timestamp))
+        latest = self.__latest
+        if latest[0] == second:
+            return latest[1]
+        date = werkzeug.http.http_date(second)
+        self.__latest = (second, date)
+        return date
+
+
+cached_http_date = HTTPDateCache()
+
+
+def freeze_header_template(headers):
+    '''Freeze template headers dict into tuple of (header, value) pairs, which is applied by apply_header_template().'''
+    return tuple(headers.items())
+
+
+def apply_header_template(original_headers, header_template, current_unix_timestamp):
+    '''Add frozen template headers and Date missing in original_headers by one bulk update.'''
+    missing_headers = [(header, value) for (header, value) in header_template if header not in original_headers]
+    if 'Date' not in original_headers:
+        missing_headers.append(('Date', cached_http_date(current_unix_timestamp)))
+    if missing_headers:
+        original_headers.extend(missing_headers)
+
+
+# upper bounds of latency buckets in second, 0.25ms to about 16s
+DEFAULT_LATENCY_BUCKETS = tuple(0.00025*(2**i) for i in range(17))
+
+
+class LatencyHistogram(object):
+    '''Thread-safe histogram of latency in second, counted into buckets of which upper bounds are bucket_bounds.'''
+    def __init__(self, bucket_bounds=DEFAULT_LATENCY_BUCKETS):
+        self.bucket_bounds = tuple(bucket_bounds)
+        self.__bucket_counts = [0]*(len(self.bucket_bounds)+1)
+        self.__sum = 0.0
+        self.__lock = threading.Lock()
+
+    def observe(self, second):
+        index = bisect.bisect_left(self.bucket_bounds, second)
+        with self.__lock:
+            self.__bucket_counts[index] += 1
+            self.__sum += second
+
+    def snapshot(self):
+        '''Return (cumulative bucket counts with +Inf bucket at last, sum, count).'''
+        with self.__lock:
+            bucket_counts = list(self.__bucket_counts)
+            total = self.__sum
+        cumulative_counts = []
+        count = 0
+        for bucket_count in bucket_counts:
+            count += bucket_count
+            cumulative_counts.append(count)
+        return (cumulative_counts, total, count)
+
+
+def _escape_prometheus_label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class TimingRegistry(object):
+    '''In-process registry of LatencyHistogram per (endpoint, phase).
+    Phase is "view" for request processing function and "build" for making response and attaching headers.
+    '''
+    def __init__(self, name='flask_response_duration_seconds', bucket_bounds=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.bucket_bounds = tuple(bucket_bounds)
+        self.__histograms = {}
+        self.__lock = threading.Lock()
+
+    def observe(self, endpoint, phase, second):
+        key = (endpoint, phase)
+        histogram = self.__histograms.get(key)
+        if histogram is None:
+            with self.__lock:
+                histogram = self.__histograms.setdefault(key, LatencyHistogram(self.bucket_bounds))
+        histogram.observe(second)
+
+    def snapshot(self):
+        '''Return dict of (endpoint, phase): LatencyHistogram.snapshot().'''
+        with self.__lock:
+            histograms = dict(self.__histograms)
+        return dict((key, histogram.snapshot()) for (key, histogram) in histograms.items())
+
+    def render_prometheus(self):
+        '''Render all histograms in Prometheus text exposition format.'''
+        lines = [
+            '# HELP %s Latency of flask request processing function and response building.' % (self.name,),
+            '# TYPE %s histogram' % (self.name,),
+        ]
+        bounds = ['%.6g' % (bound,) for bound in self.bucket_bounds]+['+Inf']
+        for ((endpoint, phase), (cumulative_counts, total, count)) in sorted(self.snapshot().items(), key=lambda item: (str(item[0][0]), item[0][1])):
+            labels = 'endpoint="%s",phase="%s"' % (_escape_prometheus_label_value(str(endpoint)), phase)
+            for (bound, cumulative_count) in zip(bounds, cumulative_counts):
+                lines.append('%s_bucket{%s,le="%s"} %d' % (self.name, labels, bound, cumulative_count))
+            lines.append('%s_sum{%s} %.9f' % (self.name, labels, total))
+            lines.append('%s_count{%s} %d' % (self.name, labels, count))
+        return '\n'.join(lines)+'\n'
+
+    def metrics_view(self):
+        '''Request processing function which exposes histograms, e.g. app.add_url_rule('/metrics', 'metrics', registry.metrics_view).'''
+        return flask.Response(self.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 def __add_cache_control_to_headers(headers, s_maxage):
     headers['Cache-Control'] = 'public,s-maxage=%d' % (s_maxage,)
 
@@ -56,7 +182,26 @@ def add_precise_cache_control_to_headers(headers, second):
     __add_cache_control_to_headers(headers, s_maxage)
 
 
-def template_response_headers(headers={}):
+def __finish_template_response(rv, header_template):
+    response = flask.make_response(rv)
+    apply_header_template(response.headers, header_template, flask.g.current_unix_timestamp)
+    return response
+
+
+def __finish_timed_template_response(rv, header_template, timing, start_time, view_end_time):
+    response = __finish_template_response(rv, header_template)
+    end_time = time.perf_counter()
+
+    view_duration = view_end_time-start_time
+    build_duration = end_time-view_end_time
+    response.headers.add('Server-Timing', 'view;dur=%.3f, build;dur=%.3f' % (view_duration*1000.0, build_duration*1000.0))
+    endpoint = flask.request.endpoint
+    timing.observe(endpoint, 'view', view_duration)
+    timing.observe(endpoint, 'build', build_duration)
+    return response
+
+
+def template_response_headers(headers={}, timing=None):
     '''This decorator attaches template headers to every response returned by request processing function.
     flask.g.current_unix_timestamp contains current UNIX timestamp.
     Because the floor of represented time stored in flask.g.current_unix_timestamp is same as represented time in HTTP header field "Date",
@@ -67,25 +212,1148 @@ def template_response_headers(headers={}):
     If we round up current unix timestamp and use it in request processing function,
     we must replace flask.g.current_unix_timestamp with rounded up timestamp before calling add_precise_cache_control_to_headers()
     and return point of request processing function.
+
+    If timing is TimingRegistry, time of request processing function and response building are measured,
+    then they are sent in HTTP header field "Server-Timing" and recorded into timing per endpoint.
+    Nothing is measured if timing is None.
+
+    If request processing function is coroutine function (async def), decorated function is coroutine function too.
     '''
+    header_template = freeze_header_template(headers)
+
     def decorator(func):
         @wraps(func)
         def decorated_function(*args, **kwargs):
             flask.g.current_unix_timestamp = time.time()
-            response = flask.make_response(func(*args, **kwargs))
-            original_headers = response.headers
-            for (header, value) in headers.items():
-                original_headers.setdefault(header, value)
-            original_headers.setdefault('Date', werkzeug.http.http_date(flask.g.current_unix_timestamp))
-            return response
-        return decorated_function
+            return __finish_template_response(func(*args, **kwargs), header_template)
+
+        @wraps(func)
+        def timed_decorated_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            flask.g.current_unix_timestamp = time.time()
+            rv = func(*args, **kwargs)
+            return __finish_timed_template_response(rv, header_template, timing, start_time, time.perf_counter())
+
+        @wraps(func)
+        async def async_decorated_function(*args, **kwargs):
+            flask.g.current_unix_timestamp = time.time()
+            return __finish_template_response(await func(*args, **kwargs), header_template)
+
+        @wraps(func)
+        async def async_timed_decorated_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            flask.g.current_unix_timestamp = time.time()
+            rv = await func(*args, **kwargs)
+            return __finish_timed_template_response(rv, header_template, timing, start_time, time.perf_counter())
+
+        if inspect.iscoroutinefunction(func):
+            return async_decorated_function if timing is None else async_timed_decorated_function
+        return decorated_function if timing is None else timed_decorated_function
     return decorator
 
 
-def cache_control(s_maxage):
+def cache_control(s_maxage, timing=None):
     '''This decorator attaches predefined cache control to every response returned by request processing function.
+    timing is passed to template_response_headers(), and coroutine function is supported in the same way.
     '''
     headers = {}
     __add_cache_control_to_headers(headers, s_maxage)
-    return template_response_headers(headers)
+    return template_response_headers(headers, timing=timing)
+
+
+CachedResponse = collections.namedtuple('CachedResponse', ['status', 'headers', 'body', 'expire_time', 'stale_time'])
+
+
+def freeze_response(response, expire_time, stale_time=None, excluded_headers=('Date', 'Cache-Control')):
+    '''Snapshot response into immutable CachedResponse.
+    By default Date and Cache-Control are excluded, because they are rebuilt when it is served.
+    '''
+    headers = tuple((header, value) for (header, value) in response.headers.items() if header not in excluded_headers)
+    return CachedResponse(response.status_code, headers, response.get_data(), expire_time, stale_time if stale_time is not None else expire_time)
+
+
+def thaw_response(cached_response):
+    return flask.Response(cached_response.body, status=cached_response.status, headers=list(cached_response.headers))
+
+
+class ResponseCache(object):
+    '''Thread-safe bounded LRU cache of CachedResponse.
+    Entry is dropped when it is looked up after its stale_time.
+    '''
+    def __init__(self, maxsize=1024):
+        self.__maxsize = maxsize
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key, current_unix_timestamp):
+        with self.__lock:
+            cached_response = self.__entries.get(key)
+            if cached_response is None:
+                return None
+            if current_unix_timestamp >= cached_response.stale_time:
+                del self.__entries[key]
+                return None
+            self.__entries.move_to_end(key)
+            return cached_response
+
+    def set(self, key, cached_response):
+        with self.__lock:
+            self.__entries[key] = cached_response
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__maxsize:
+                self.__entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.__lock:
+            self.__entries.pop(key, None)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+class RedisResponseCache(object):
+    '''CachedResponse cache shared by processes through redis, with same interface as ResponseCache except len().
+    Every entry is a redis hash of json meta and zlib compressed body,
+    which is written with EXPIREAT of its stale_time by one pipelined round trip and read by one HMGET.
+    If l1 is ResponseCache, it is looked up before redis, and entry read from redis is kept in it.
+    '''
+    def __init__(self, strict_redis, prefix='response_cache:', l1=None, compresslevel=6):
+        self.strict_redis = strict_redis
+        self.prefix = prefix
+        self.l1 = l1
+        self.compresslevel = compresslevel
+
+    def __get_redis_key(self, key):
+        return '%s%s' % (self.prefix, key)
+
+    def get(self, key, current_unix_timestamp):
+        if self.l1 is not None:
+            cached_response = self.l1.get(key, current_unix_timestamp)
+            if cached_response is not None:
+                return cached_response
+
+        (meta, body) = self.strict_redis.hmget(self.__get_redis_key(key), 'meta', 'body')
+        if meta is None or body is None:
+            return None
+        meta = json.loads(meta.decode('utf-8') if isinstance(meta, bytes) else meta)
+        if current_unix_timestamp >= meta['stale_time']:
+            return None
+        headers = tuple((header, value) for (header, value) in meta['headers'])
+        cached_response = CachedResponse(meta['status'], headers, zlib.decompress(body), meta['expire_time'], meta['stale_time'])
+        if self.l1 is not None:
+            self.l1.set(key, cached_response)
+        return cached_response
+
+    def set(self, key, cached_response):
+        meta = json.dumps({
+            'status': cached_response.status,
+            'headers': cached_response.headers,
+            'expire_time': cached_response.expire_time,
+            'stale_time': cached_response.stale_time,
+        })
+        redis_key = self.__get_redis_key(key)
+        pipe = self.strict_redis.pipeline(transaction=False)
+        pipe.hset(redis_key, mapping={'meta': meta, 'body': zlib.compress(cached_response.body, self.compresslevel)})
+        pipe.expireat(redis_key, int(math.ceil(cached_response.stale_time)))
+        pipe.execute()
+        if self.l1 is not None:
+            self.l1.set(key, cached_response)
+
+    def delete(self, key):
+        self.strict_redis.delete(self.__get_redis_key(key))
+        if self.l1 is not None:
+            self.l1.delete(key)
+
+    def clear(self):
+        redis_key_list = list(self.strict_redis.scan_iter(match='%s*' % (self.prefix,)))
+        if redis_key_list:
+            self.strict_redis.delete(*redis_key_list)
+        if self.l1 is not None:
+            self.l1.clear()
+
+
+def make_cache_key(key_headers=()):
+    '''Build cache key of current request from path, query string and values of key_headers.'''
+    request = flask.request
+    key_part_list = [request.path, request.query_string.decode('latin-1')]
+    key_part_list.extend(request.headers.get(header, '') for header in key_headers)
+    return '\n'.join(key_part_list)
+
+
+def add_session_vary(response):
+    '''Flask adds Vary: Cookie if session is accessed after request processing function returns, so add it in advance.'''
+    request_context = flask.globals.request_ctx
+    # since Flask 3.1, reading request_context.session marks session as accessed
+    session = getattr(request_context, '_session', None)
+    if session is None:
+        session = request_context.session
+    if session is not None and session.accessed:
+        response.vary.add('Cookie')
+
+
+def is_response_shareable(response, key_headers=()):
+    '''Response can be shared by requests with the same make_cache_key(key_headers) only if it is not streamed, has no Set-Cookie,
+    and every request header named by its Vary is a part of cache key.
+    For example, Flask adds Vary: Cookie when session is accessed, so such response is not shared unless Cookie is in key_headers.
+    '''
+    if response.is_streamed or 'Set-Cookie' in response.headers:
+        return False
+    key_header_set = set(header.lower() for header in key_headers)
+    return all(header.lower() in key_header_set for header in response.vary)
+
+
+def is_response_cacheable(response, key_headers=()):
+    return response.status_code == 200 and is_response_shareable(response, key_headers)
+
+
+def make_response_conditional(response, current_unix_timestamp):
+    '''Answer GET and HEAD request with 304 if its If-None-Match or If-Modified-Since matches ETag or Last-Modified of response.'''
+    request = flask.request
+    if_modified_since = request.if_modified_since
+    if if_modified_since is not None and if_modified_since.timestamp() > current_unix_timestamp:
+        # If-Modified-Since later than current time is invalid and must be ignored (RFC 7232 section 3.3)
+        environ = dict(request.environ)
+        del environ['HTTP_IF_MODIFIED_SINCE']
+        return response.make_conditional(environ)
+    return response.make_conditional(request)
+
+
+def serve_cached_response(cached_response, current_unix_timestamp):
+    '''Rebuild response from cache, with s-maxage shortened so that it still expires at the same time as CDN copy.
+    Conditional request is answered with 304 if cached response has matching ETag or Last-Modified.
+    '''
+    response = thaw_response(cached_response)
+    s_maxage = max(int(cached_response.expire_time-math.floor(current_unix_timestamp)), 0)
+    __add_cache_control_to_headers(response.headers, s_maxage)
+    response.headers['Date'] = cached_http_date(current_unix_timestamp)
+    return make_response_conditional(response, current_unix_timestamp)
+
+
+class SingleFlightError(RuntimeError):
+    '''Raised in every caller waiting for computation which failed, with the exception raised by leader as __cause__.
+    Waiters do not re-raise the exception of leader, so its traceback is not touched by other threads.
+    '''
+    pass
+
+
+class SingleFlight(object):
+    '''Run at most one computation per key at the same time.
+    Concurrent callers of the same key wait for the running computation and share its result.
+    '''
+    class __Call(object):
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__calls = {}
+
+    def run(self, key, func, wait=True):
+        '''Return (is_leader, result).
+        Leader runs func and gets its result, other callers get the same result,
+        or their own SingleFlightError caused by exception raised by func.
+        If wait is False and computation of key is running, return (False, None) at once.
+        '''
+        with self.__lock:
+            call = self.__calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.__Call()
+                self.__calls[key] = call
+        if not is_leader:
+            if not wait:
+                return (False, None)
+            call.event.wait()
+            if call.error is not None:
+                raise SingleFlightError('computation of %s failed' % (repr(key),)) from call.error
+            return (False, call.result)
+
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self.__lock:
+                del self.__calls[key]
+            call.event.set()
+        return (True, call.result)
+
+
+def __reject_coroutine_function(func, decorator_name):
+    if inspect.iscoroutinefunction(func):
+        raise TypeError('%s() does not support coroutine function %s, because waiting requests block their threads' % (decorator_name, func.__name__))
+
+
+def single_flight(key_headers=(), flight=None):
+    '''This decorator runs request processing function once for concurrent identical GET and HEAD requests,
+    which are identified by make_cache_key(key_headers).
+    Waiting requests get copies of the response of the running request if it is shareable, see is_response_shareable().
+    Otherwise they run request processing function by themselves.
+    It is thread-safe under threaded WSGI servers, and does not coalesce requests across processes.
+    Coroutine function is not supported.
+    '''
+    if flight is None:
+        flight = SingleFlight()
+
+    def decorator(func):
+        __reject_coroutine_function(func, 'single_flight')
+
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            if flask.request.method not in ('GET', 'HEAD'):
+                return func(*args, **kwargs)
+            response_holder = []
+            def compute():
+                response = flask.make_response(func(*args, **kwargs))
+                response_holder.append(response)
+                add_session_vary(response)
+                if not is_response_shareable(response, key_headers):
+                    return None
+                return freeze_response(response, 0.0, excluded_headers=())
+            (is_leader, cached) = flight.run(make_cache_key(key_headers), compute)
+            if is_leader:
+                return response_holder[0]
+            if cached is None:
+                return func(*args, **kwargs)
+            return thaw_response(cached)
+        return decorated_function
+    return decorator
+
+
+def __render_cacheable_response(func, args, kwargs, header_template, key_headers, second, stale_while_revalidate):
+    '''Run request processing function, return (response, CachedResponse or None if it is not cacheable).'''
+    response = flask.make_response(func(*args, **kwargs))
+    original_headers = response.headers
+    is_cache_control_added = 'Cache-Control' not in original_headers and all(header != 'Cache-Control' for (header, value) in header_template)
+    if is_cache_control_added:
+        add_precise_cache_control_to_headers(original_headers, second)
+    apply_header_template(original_headers, header_template, flask.g.current_unix_timestamp)
+    add_session_vary(response)
+
+    cached = None
+    if is_cache_control_added and is_response_cacheable(response, key_headers):
+        timestamp = flask.g.current_unix_timestamp
+        expire_time = math.floor(timestamp)+round_maxage(timestamp, second)
+        cached = freeze_response(response, expire_time, expire_time+stale_while_revalidate)
+    return (response, cached)
+
+
+def cached_response(second, cache=None, key_headers=(), headers={}, maxsize=1024, coalesce=False, stale_while_revalidate=0):
+    '''This decorator caches finished response of GET and HEAD request in process, keyed by make_cache_key(key_headers).
+    Response gets template headers and precise cache control s-maxage of second like add_precise_cache_control_to_headers(),
+    and cached entry expires when the CDN copy expires: floor(flask.g.current_unix_timestamp)+s-maxage.
+    cache is ResponseCache like object, new ResponseCache(maxsize) is used if it is None.
+
+    If coalesce is True, concurrent requests which miss cache run request processing function only once, see SingleFlight.
+    If stale_while_revalidate is positive, expired entry is kept for that many seconds more.
+    Then one request refreshes it, and concurrent requests get the stale entry with s-maxage=0 instead of waiting.
+
+    Only 200 responses which are not streamed, have no Set-Cookie and no Cache-Control set by request processing function are cached.
+    Headers which change response content, like Accept-Encoding, must be listed in key_headers,
+    and response whose Vary names header not in key_headers is not cached, see is_response_cacheable().
+    Coroutine function is not supported, put template_response_headers() or cache_control() on it instead.
+    '''
+    if cache is None:
+        cache = ResponseCache(maxsize)
+    flight = SingleFlight()
+    header_template = freeze_header_template(headers)
+
+    def decorator(func):
+        __reject_coroutine_function(func, 'cached_response')
+
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            current_unix_timestamp = time.time()
+            flask.g.current_unix_timestamp = current_unix_timestamp
+            if flask.request.method not in ('GET', 'HEAD'):
+                return __render_cacheable_response(func, args, kwargs, header_template, key_headers, second, stale_while_revalidate)[0]
+
+            key = make_cache_key(key_headers)
+            cached = cache.get(key, current_unix_timestamp)
+            if cached is not None and current_unix_timestamp < cached.expire_time:
+                return serve_cached_response(cached, current_unix_timestamp)
+
+            response_holder = []
+            def refresh():
+                (response, new_cached) = __render_cacheable_response(func, args, kwargs, header_template, key_headers, second, stale_while_revalidate)
+                response_holder.append(response)
+                if new_cached is not None:
+                    cache.set(key, new_cached)
+                return new_cached
+
+            if cached is not None:
+                # stale entry: only one request refreshes it
+                (is_leader, new_cached) = flight.run(key, refresh, wait=False)
+                if is_leader:
+                    return response_holder[0]
+                return serve_cached_response(cached, current_unix_timestamp)
+            if coalesce:
+                (is_leader, new_cached) = flight.run(key, refresh)
+                if is_leader:
+                    return response_holder[0]
+                if new_cached is not None:
+                    return serve_cached_response(new_cached, time.time())
+            refresh()
+            return response_holder[0]
+        return decorated_function
+    return decorator
+
+
+def compute_body_etag(response):
+    '''Compute strong ETag value by hashing body chunk by chunk, without joining body.'''
+    hash_obj = hashlib.sha1()
+    for chunk in response.iter_encoded():
+        hash_obj.update(chunk)
+    return hash_obj.hexdigest()
+
+
+def __ensure_current_unix_timestamp():
+    if 'current_unix_timestamp' not in flask.g:
+        flask.g.current_unix_timestamp = time.time()
+
+
+def conditional_response(version_func=None):
+    '''This decorator makes response of GET and HEAD request conditional.
+    ETag is version_func(*args, **kwargs) if version_func is given, which is evaluated before request processing function.
+    If it matches If-None-Match, 304 is returned and request processing function is not called at all.
+    Otherwise ETag is hash of response body, streamed response does not get it.
+    Last-Modified is derived from flask.g.current_unix_timestamp, and If-None-Match or If-Modified-Since is answered with 304.
+    If-Modified-Since later than current time is ignored.
+
+    Put it under template_response_headers() or cached_response(), so that flask.g.current_unix_timestamp is shared with them
+    and 304 response also gets their headers.
+    Under cached_response(), cached response keeps ETag and Last-Modified, and cache hit is answered with 304 by serve_cached_response()
+    without calling version_func, so version_func must not change within s-maxage.
+    Coroutine function is supported, while version_func is always called synchronously.
+    '''
+    def start_conditional_response(args, kwargs):
+        '''Return (ETag or None, 304 response or None).'''
+        __ensure_current_unix_timestamp()
+        if version_func is None:
+            return (None, None)
+        etag = version_func(*args, **kwargs)
+        request = flask.request
+        if request.method in ('GET', 'HEAD') and request.if_none_match.contains_weak(etag):
+            response = flask.Response(status=304)
+            response.set_etag(etag)
+            return (etag, response)
+        return (etag, None)
+
+    def finish_conditional_response(rv, etag):
+        request = flask.request
+        response = flask.make_response(rv)
+        if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+            return response
+        if etag is not None:
+            response.set_etag(etag)
+        elif 'ETag' not in response.headers and not response.is_streamed:
+            response.set_etag(compute_body_etag(response))
+        original_headers = response.headers
+        current_http_date = cached_http_date(flask.g.current_unix_timestamp)
+        original_headers.setdefault('Last-Modified', current_http_date)
+        original_headers.setdefault('Date', current_http_date)
+        return make_response_conditional(response, flask.g.current_unix_timestamp)
+
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            (etag, not_modified_response) = start_conditional_response(args, kwargs)
+            if not_modified_response is not None:
+                return not_modified_response
+            return finish_conditional_response(func(*args, **kwargs), etag)
+
+        @wraps(func)
+        async def async_decorated_function(*args, **kwargs):
+            (etag, not_modified_response) = start_conditional_response(args, kwargs)
+            if not_modified_response is not None:
+                return not_modified_response
+            return finish_conditional_response(await func(*args, **kwargs), etag)
+
+        return async_decorated_function if inspect.iscoroutinefunction(func) else decorated_function
+    return decorator
+
+
+class CompressedBodyCache(object):
+    '''Thread-safe LRU cache of compressed bodies, bounded by number of entries and total bytes.'''
+    def __init__(self, maxsize=256, max_bytes=64*1024*1024):
+        self.__maxsize = maxsize
+        self.__max_bytes = max_bytes
+        self.__total_bytes = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def get(self, key):
+        with self.__lock:
+            body = self.__entries.get(key)
+            if body is not None:
+                self.__entries.move_to_end(key)
+            return body
+
+    def set(self, key, body):
+        if len(body) > self.__max_bytes:
+            return
+        with self.__lock:
+            old_body = self.__entries.pop(key, None)
+            if old_body is not None:
+                self.__total_bytes -= len(old_body)
+            self.__entries[key] = body
+            self.__total_bytes += len(body)
+            while len(self.__entries) > self.__maxsize or self.__total_bytes > self.__max_bytes:
+                (_, evicted_body) = self.__entries.popitem(last=False)
+                self.__total_bytes -= len(evicted_body)
+
+    def __len__(self):
+        return len(self.__entries)
+
+
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+])
+
+
+def is_mimetype_compressible(mimetype):
+    if mimetype is None:
+        return False
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES or mimetype.endswith('+json') or mimetype.endswith('+xml')
+
+
+def compress_body(body, content_encoding, compresslevel=6):
+    if content_encoding == 'gzip':
+        return gzip.compress(body, compresslevel=compresslevel, mtime=0)
+    if content_encoding == 'deflate':
+        return zlib.compress(body, compresslevel)
+    raise ValueError('unsupported content encoding %s' % (repr(content_encoding),))
+
+
+def compress_response(min_size=1024, compresslevel=6, content_encodings=('gzip', 'deflate'), cache=None, maxsize=256):
+    '''This decorator compresses response body with gzip or deflate negotiated by Accept-Encoding.
+    Only 200 responses which are not streamed, not encoded yet, compressible and not smaller than min_size are compressed,
+    and Vary: Accept-Encoding is added to every compressible response.
+    Compressed bodies are cached by (path, query string and strong ETag, or hash of body, content encoding),
+    so response with same body is compressed only once. cache is CompressedBodyCache like object.
+    Strong ETag becomes weak ETag in compressed response, which still matches If-None-Match.
+
+    Put it over cached_response() to cache identity body and compress every variant once,
+    or list Accept-Encoding in key_headers of cached_response() if it is put under cached_response().
+    Coroutine function is supported.
+    '''
+    if cache is None:
+        cache = CompressedBodyCache(maxsize)
+
+    def finish_compressed_response(rv):
+        response = flask.make_response(rv)
+        if not is_mimetype_compressible(response.mimetype):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or response.is_streamed or 'Content-Encoding' in response.headers:
+            return response
+        content_encoding = flask.request.accept_encodings.best_match(content_encodings)
+        if content_encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+
+        (etag, is_weak) = response.get_etag()
+        if etag is not None and not is_weak:
+            # ETag is unique only within one resource
+            cache_key = ('etag', flask.request.path, flask.request.query_string, etag, content_encoding)
+        else:
+            cache_key = ('sha1', hashlib.sha1(body).hexdigest(), content_encoding)
+        compressed_body = cache.get(cache_key)
+        if compressed_body is None:
+            compressed_body = compress_body(body, content_encoding, compresslevel)
+            cache.set(cache_key, compressed_body)
+
+        response.set_data(compressed_body)
+        response.headers['Content-Encoding'] = content_encoding
+        if etag is not None:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def decorator(func):
+        @wraps(func)
+        def decorated_function(*args, **kwargs):
+            return finish_compressed_response(func(*args, **kwargs))
+
+        @wraps(func)
+        async def async_decorated_function(*args, **kwargs):
+            return finish_compressed_response(await func(*args, **kwargs))
+
+        return async_decorated_function if inspect.iscoroutinefunction(func) else decorated_function
+    return decorator
+
+
+def stream_response(generator, mimetype=None, headers=None, with_context=True):
+    '''Return streamed response whose body is produced by generator chunk by chunk.
+    If with_context is True, request context is kept while generator runs, so it can still access flask.request and flask.g.
+    '''
+    if with_context:
+        generator = flask.stream_with_context(generator)
+    return flask.Response(generator, mimetype=mimetype, headers=headers)
+
+
+def __get_file_size(fp):
+    try:
+        return os.fstat(fp.fileno()).st_size
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        fp.seek(0, os.SEEK_END)
+        size = fp.tell()
+        fp.seek(0)
+        return size
+
+
+def file_response(fp, mimetype='application/octet-stream', size=None, etag=None, last_modified=None, download_name=None, buffer_size=8192):
+    '''Return streamed response of binary file object fp, which is read from its beginning.
+    Body is wrapped by wsgi.file_wrapper of WSGI server, so that it can be sent by sendfile() if the server supports it.
+    If fp is seekable, Range request of GET and HEAD is answered with 206 Partial Content.
+    etag and last_modified are also checked against If-None-Match, If-Modified-Since and If-Range.
+    fp is closed by WSGI server when response is finished.
+    '''
+    __ensure_current_unix_timestamp()
+    request = flask.request
+    is_seekable = getattr(fp, 'seekable', lambda: False)()
+    if is_seekable:
+        # e.g. export which is just written to temporary file
+        fp.seek(0)
+        if size is None:
+            size = __get_file_size(fp)
+
+    data = werkzeug.wsgi.wrap_file(request.environ, fp, buffer_size)
+    response = flask.Response(data, mimetype=mimetype, direct_passthrough=True)
+    if size is not None:
+        response.content_length = size
+    if download_name is not None:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    if etag is not None:
+        response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Date'] = cached_http_date(flask.g.current_unix_timestamp)
+    if is_seekable:
+        return response.make_conditional(request, accept_ranges=True, complete_length=size)
+    return response.make_conditional(request)
+
+
+def __iter_csv_chunks(rows, header, encoding, dialect, rows_per_chunk):
+    # one incremental encoder for whole stream, so that BOM of encoding like utf-16 is written only once
+    encoder = codecs.getincrementalencoder(encoding)()
+    buf = io.StringIO()
+    csv_writer = csv.writer(buf, dialect=dialect)
+    if header is not None:
+        csv_writer.writerow(header)
+    row_count = 0
+    for row in rows:
+        csv_writer.writerow(row)
+        row_count += 1
+        if row_count >= rows_per_chunk:
+            yield encoder.encode(buf.getvalue())
+            buf.seek(0)
+            buf.truncate()
+            row_count = 0
+    chunk = encoder.encode(buf.getvalue(), final=True)
+    if chunk:
+        yield chunk
+
+
+def csv_stream_response(rows, header=None, encoding='utf-8', dialect='excel', download_name=None, rows_per_chunk=1000, with_context=True):
+    '''Return streamed text/csv response of rows, which is iterable of row lists.
+    Rows are written by csv module and sent every rows_per_chunk rows, so whole export is never built in memory.
+    '''
+    response = stream_response(__iter_csv_chunks(rows, header, encoding, dialect, rows_per_chunk), with_context=with_context)
+    response.headers['Content-Type'] = 'text/csv; charset=%s' % (encoding,)
+    if download_name is not None:
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    return response
+
+
+# test case
+
+import re
+import itertools
+import asyncio
+import tempfile
+import unittest
+import threading
+
+import werkzeug.datastructures
+
+
+class FlaskResponseUtilTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = flask.Flask(__name__)
+        self.call_count = collections.Counter()
+        self.cache = ResponseCache(maxsize=2)
+        call_count = self.call_count
+
+        self.app.secret_key = 'test secret key'
+
+        @self.app.route('/login/<name>')
+        def login_view(name):
+            flask.session['user'] = name
+            return 'login'
+
+        @self.app.route('/me')
+        @cached_response(10)
+        def me_view():
+            return 'hello %s' % (flask.session.get('user'),)
+
+        @self.app.route('/cached', methods=['GET', 'POST'])
+        @cached_response(10, cache=self.cache, key_headers=('X-Variant',), headers={'X-Template': 'yes'})
+        def cached_view():
+            call_count['cached'] += 1
+            return 'body %s %s' % (flask.request.args.get('q', ''), flask.request.headers.get('X-Variant', ''))
+
+        self.slow_view_event = threading.Event()
+        slow_view_event = self.slow_view_event
+
+        @self.app.route('/single_flight')
+        @single_flight()
+        def single_flight_view():
+            call_count['single_flight'] += 1
+            slow_view_event.wait(5.0)
+            return flask.make_response('single flight', 201, {'Cache-Control': 'no-cache'})
+
+        cookie_counter = itertools.count(1)
+
+        @self.app.route('/single_flight_cookie')
+        @single_flight()
+        def single_flight_cookie_view():
+            call_count['single_flight_cookie'] += 1
+            slow_view_event.wait(5.0)
+            response = flask.make_response('single flight cookie')
+            response.set_cookie('session', 'user-%d' % (next(cookie_counter),))
+            return response
+
+        self.error_list = []
+
+        @self.app.errorhandler(ValueError)
+        @self.app.errorhandler(SingleFlightError)
+        def record_error(e):
+            self.error_list.append(e)
+            return 'error', 500
+
+        @self.app.route('/failing_coalesced')
+        @cached_response(10, coalesce=True)
+        def failing_coalesced_view():
+            call_count['failing_coalesced'] += 1
+            slow_view_event.wait(5.0)
+            raise ValueError('failing view')
+
+        self.swr_cache = ResponseCache()
+
+        @self.app.route('/coalesced')
+        @cached_response(10, cache=self.swr_cache, coalesce=True, stale_while_revalidate=30)
+        def coalesced_view():
+            call_count['coalesced'] += 1
+            slow_view_event.wait(5.0)
+            return 'coalesced %d' % (call_count['coalesced'],)
+
+        @self.app.route('/conditional/<int:version>')
+        @template_response_headers()
+        @conditional_response(version_func=lambda version: 'v%d' % (version,))
+        def versioned_view(version):
+            call_count['versioned'] += 1
+            return 'version %d' % (version,)
+
+        @self.app.route('/cached_conditional')
+        @cached_response(10)
+        @conditional_response(lambda: 'v1')
+        def cached_conditional_view():
+            call_count['cached_conditional'] += 1
+            return 'cached conditional'
+
+        @self.app.route('/conditional')
+        @cache_control(10)
+        @conditional_response()
+        def hashed_view():
+            call_count['hashed'] += 1
+            return 'hashed body'
+
+        self.compressed_body_cache = CompressedBodyCache()
+
+        @self.app.route('/compressed/<int:size>')
+        @cache_control(10)
+        @compress_response(cache=self.compressed_body_cache)
+        def compressed_view(size):
+            return flask.jsonify(data='x'*size)
+
+        @self.app.route('/compressed_item/<int:item_id>')
+        @compress_response(min_size=1, cache=self.compressed_body_cache)
+        @conditional_response(lambda item_id: 'v3')
+        def compressed_item_view(item_id):
+            return flask.jsonify(name=['alice', 'bob'][item_id-1])
+
+        self.file_content = b''.join(b'%04d\n' % (i,) for i in range(1000))
+
+        @self.app.route('/file')
+        @cache_control(10)
+        def file_view():
+            return file_response(io.BytesIO(self.file_content), mimetype='text/plain', etag='file-v1', download_name='file.txt')
+
+        @self.app.route('/stream')
+        @cache_control(10)
+        def stream_view():
+            def generate():
+                for i in range(3):
+                    yield '%s-%d\n' % (flask.request.args['name'], i)
+            return stream_response(generate(), mimetype='text/plain')
+
+        @self.app.route('/csv_stream')
+        @template_response_headers()
+        def csv_stream_view():
+            return csv_stream_response(([i, u'名前 "%d"' % (i,)] for i in range(5)), header=['id', 'name'], encoding=flask.request.args.get('encoding', 'utf-8'), rows_per_chunk=2)
+
+        @self.app.route('/temp_file')
+        def temp_file_view():
+            fp = tempfile.TemporaryFile()
+            fp.write(b'exported')
+            return file_response(fp, mimetype='text/plain')
+
+        self.timing = TimingRegistry()
+        self.app.add_url_rule('/metrics', 'metrics', self.timing.metrics_view)
+
+        @self.app.route('/timed')
+        @cache_control(10, timing=self.timing)
+        def timed_view():
+            return 'timed'
+
+        @self.app.route('/async/<int:version>')
+        @cache_control(10, timing=self.timing)
+        @compress_response(min_size=1)
+        @conditional_response(lambda version: 'v%d' % (version,))
+        async def async_view(version):
+            await asyncio.sleep(0)
+            return 'async %d %s' % (version, flask.g.current_unix_timestamp > 0)
+
+        self.client = self.app.test_client()
+
+    def __get_concurrently(self, path, count):
+        response_list = [None]*count
+        def get(i):
+            response_list[i] = self.app.test_client().get(path)
+        thread_list = [threading.Thread(target=get, args=(i,)) for i in range(count)]
+        for thread in thread_list:
+            thread.start()
+        time.sleep(0.2)
+        self.slow_view_event.set()
+        for thread in thread_list:
+            thread.join()
+        self.slow_view_event.clear()
+        return response_list
+
+    def test_cached_response(self):
+        now = time.time()
+        response = self.client.get('/cached?q=1')
+        self.assertEqual(response.get_data(), b'body 1 ')
+        self.assertEqual(response.headers['X-Template'], 'yes')
+        self.assertTrue(response.headers['Cache-Control'].startswith('public,s-maxage='))
+        response = self.client.get('/cached?q=1')
+        self.assertEqual(response.get_data(), b'body 1 ')
+        self.assertEqual(response.headers['X-Template'], 'yes')
+        self.assertTrue('Date' in response.headers)
+        self.assertEqual(self.call_count['cached'], 1, 'cached response is not used')
+
+        s_maxage = int(response.headers['Cache-Control'].split('=')[1])
+        self.assertTrue(9 <= s_maxage <= 10, 's-maxage is wrong')
+
+        self.client.get('/cached?q=2')
+        self.client.get('/cached?q=2', headers={'X-Variant': 'v'})
+        self.assertEqual(self.call_count['cached'], 3, 'cache key is wrong')
+        self.assertEqual(len(self.cache), 2, 'cache is not bounded')
+        key = '/cached\nq=2\nv'
+        self.assertTrue(self.cache.get(key, now) is not None)
+        self.assertTrue(self.cache.get(key, now+11) is None, 'expired response is used')
+
+        self.cache.clear()
+        self.client.post('/cached?q=1')
+        self.assertEqual(len(self.cache), 0, 'POST response is cached')
+
+    def test_cached_response_vary(self):
+        for name in ('alice', 'bob'):
+            client = self.app.test_client()
+            client.get('/login/%s' % (name,))
+            response = client.get('/me')
+            self.assertEqual(response.get_data(as_text=True), 'hello %s' % (name,), 'response of another session is used')
+            self.assertTrue('Cookie' in response.vary)
+
+    def test_single_flight(self):
+        response_list = self.__get_concurrently('/single_flight', 5)
+        self.assertEqual(self.call_count['single_flight'], 1, 'requests are not coalesced')
+        for response in response_list:
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.get_data(), b'single flight')
+            self.assertEqual(response.headers['Cache-Control'], 'no-cache')
+
+        response_list = self.__get_concurrently('/single_flight_cookie', 3)
+        self.assertEqual(self.call_count['single_flight_cookie'], 3, 'response with Set-Cookie is shared')
+        self.assertEqual(len(set(response.headers['Set-Cookie'] for response in response_list)), 3)
+
+    def test_coalesce_failure(self):
+        response_list = self.__get_concurrently('/failing_coalesced', 5)
+        self.assertEqual(self.call_count['failing_coalesced'], 1, 'requests are not coalesced')
+        self.assertTrue(all(response.status_code == 500 for response in response_list))
+        self.assertEqual(len(set(id(e) for e in self.error_list)), 5, 'exception instance is shared')
+        leader_error_list = [e for e in self.error_list if isinstance(e, ValueError)]
+        self.assertEqual(len(leader_error_list), 1)
+        for e in self.error_list:
+            if e is not leader_error_list[0]:
+                self.assertTrue(isinstance(e, SingleFlightError))
+                self.assertTrue(e.__cause__ is leader_error_list[0])
+
+    def test_coalesce_and_stale_while_revalidate(self):
+        response_list = self.__get_concurrently('/coalesced', 5)
+        self.assertEqual(self.call_count['coalesced'], 1, 'requests are not coalesced')
+        self.assertTrue(all(response.get_data() == b'coalesced 1' for response in response_list))
+
+        key = '/coalesced\n'
+        cached = self.swr_cache.get(key, time.time())
+        self.swr_cache.set(key, cached._replace(expire_time=time.time()-1.0))
+        response_list = self.__get_concurrently('/coalesced', 5)
+        self.assertEqual(self.call_count['coalesced'], 2, 'stale entry is not refreshed once')
+        body_list = sorted(response.get_data() for response in response_list)
+        self.assertEqual(body_list, [b'coalesced 1']*4+[b'coalesced 2'])
+        self.assertTrue(all(response.headers['Cache-Control'] == 'public,s-maxage=0' for response in response_list if response.get_data() == b'coalesced 1'))
+        self.assertEqual(self.client.get('/coalesced').get_data(), b'coalesced 2')
+
+    def test_conditional_response(self):
+        response = self.client.get('/conditional/3')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['ETag'], '"v3"')
+        self.assertTrue('Last-Modified' in response.headers)
+        response = self.client.get('/conditional/3', headers={'If-None-Match': 'W/"v3"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], '"v3"')
+        self.assertTrue('Date' in response.headers)
+        self.assertEqual(self.call_count['versioned'], 1, 'request processing function is called')
+        self.assertEqual(self.client.get('/conditional/4', headers={'If-None-Match': '"v3"'}).status_code, 200)
+
+        response = self.client.get('/conditional')
+        etag = response.headers['ETag']
+        self.assertEqual(etag, '"%s"' % (hashlib.sha1(b'hashed body').hexdigest(),))
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        response = self.client.get('/conditional', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        response = self.client.get('/conditional', headers={'If-Modified-Since': werkzeug.http.http_date(time.time()+3600)})
+        self.assertEqual(response.status_code, 200, 'If-Modified-Since in the future is not ignored')
+        response = self.client.get('/conditional', headers={'If-Modified-Since': werkzeug.http.http_date(time.time()-3600)})
+        self.assertEqual(response.status_code, 200)
+
+        # conditional_response under cached_response
+        response = self.client.get('/cached_conditional')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b'cached conditional')
+        for i in range(2):
+            response = self.client.get('/cached_conditional', headers={'If-None-Match': '"v1"'})
+            self.assertEqual(response.status_code, 304, 'cache hit is not conditional')
+            self.assertEqual(response.get_data(), b'')
+            self.assertEqual(response.headers['ETag'], '"v1"')
+            self.assertTrue(response.headers['Cache-Control'].startswith('public,s-maxage='))
+        response = self.client.get('/cached_conditional', headers={'If-None-Match': '"v0"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), b'cached conditional')
+        self.assertEqual(self.call_count['cached_conditional'], 1, 'cached response is not used')
+
+    def test_compress_response(self):
+        identity_body = self.client.get('/compressed/4096').get_data()
+        response = self.client.get('/compressed/4096', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        self.assertEqual(gzip.decompress(response.get_data()), identity_body)
+        self.assertEqual(int(response.headers['Content-Length']), len(response.get_data()))
+        self.client.get('/compressed/4096', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(len(self.compressed_body_cache), 1, 'compressed body is not cached')
+
+        response = self.client.get('/compressed/4096', headers={'Accept-Encoding': 'gzip;q=0, deflate'})
+        self.assertEqual(response.headers['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(response.get_data()), identity_body)
+
+        response = self.client.get('/compressed/10', headers={'Accept-Encoding': 'gzip'})
+        self.assertFalse('Content-Encoding' in response.headers, 'small body is compressed')
+        self.assertEqual(response.headers['Vary'], 'Accept-Encoding')
+
+        # different resources which share the same version string
+        for item_id in (1, 2):
+            identity_body = self.client.get('/compressed_item/%d' % (item_id,)).get_data()
+            response = self.client.get('/compressed_item/%d' % (item_id,), headers={'Accept-Encoding': 'gzip'})
+            self.assertEqual(response.headers['ETag'], 'W/"v3"')
+            self.assertEqual(gzip.decompress(response.get_data()), identity_body, 'compressed body of another resource is used')
+
+    def test_cached_http_date(self):
+        http_date = HTTPDateCache()
+        current_unix_timestamp = math.floor(time.time())
+        date = http_date(current_unix_timestamp+0.25)
+        self.assertEqual(date, werkzeug.http.http_date(current_unix_timestamp))
+        self.assertTrue(http_date(current_unix_timestamp+0.75) is date, 'HTTP date is not reused within the same second')
+        self.assertEqual(http_date(current_unix_timestamp+1.0), werkzeug.http.http_date(current_unix_timestamp+1))
+
+        original_headers = werkzeug.datastructures.Headers([('Cache-Control', 'no-cache')])
+        apply_header_template(original_headers, freeze_header_template({'Cache-Control': 'public,s-maxage=10', 'X-Template': 'yes'}), current_unix_timestamp)
+        self.assertEqual(original_headers['Cache-Control'], 'no-cache')
+        self.assertEqual(original_headers['X-Template'], 'yes')
+        self.assertEqual(original_headers['Date'], werkzeug.http.http_date(current_unix_timestamp))
+
+    def test_stream_response(self):
+        response = self.client.get('/file')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_data(), self.file_content)
+        self.assertEqual(response.headers['Accept-Ranges'], 'bytes')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        self.assertTrue('Date' in response.headers)
+        self.assertEqual(response.headers['Content-Disposition'], 'attachment; filename=file.txt')
+
+        response = self.client.get('/file', headers={'Range': 'bytes=10-19'})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.get_data(), self.file_content[10:20])
+        self.assertEqual(response.headers['Content-Range'], 'bytes 10-19/%d' % (len(self.file_content),))
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+
+        response = self.client.get('/file', headers={'Range': 'bytes=10-19', 'If-Range': '"file-v0"'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/file', headers={'If-None-Match': '"file-v1"'})
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get('/stream?name=item')
+        self.assertTrue(response.is_streamed)
+        self.assertEqual(response.get_data(), b'item-0\nitem-1\nitem-2\n')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        self.assertTrue('Date' in response.headers)
+
+        response = self.client.get('/csv_stream')
+        self.assertEqual(response.headers['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(list(csv.reader(io.StringIO(response.get_data().decode('utf-8')))), [['id', 'name']]+[[str(i), u'名前 "%d"' % (i,)] for i in range(5)])
+
+        response = self.client.get('/csv_stream?encoding=utf-16')
+        self.assertEqual(response.get_data().count(codecs.BOM_UTF16), 1, 'BOM is written in every chunk')
+        self.assertEqual(list(csv.reader(io.StringIO(response.get_data().decode('utf-16')))), [['id', 'name']]+[[str(i), u'名前 "%d"' % (i,)] for i in range(5)])
+
+        # file which is not rewound after written
+        response = self.client.get('/temp_file')
+        self.assertEqual(response.get_data(), b'exported')
+        self.assertEqual(response.headers['Content-Length'], '8')
+
+    def test_timing(self):
+        for i in range(3):
+            response = self.client.get('/timed')
+        self.assertEqual(response.get_data(), b'timed')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        self.assertTrue(re.match(r'^view;dur=\d+\.\d{3}, build;dur=\d+\.\d{3}$', response.headers['Server-Timing']))
+        self.assertFalse('Server-Timing' in self.client.get('/cached').headers)
+
+        snapshot = self.timing.snapshot()
+        self.assertEqual(sorted(snapshot.keys()), [('timed_view', 'build'), ('timed_view', 'view')])
+        (cumulative_counts, total, count) = snapshot[('timed_view', 'view')]
+        self.assertEqual(count, 3)
+        self.assertEqual(cumulative_counts[-1], 3)
+        self.assertEqual(len(cumulative_counts), len(DEFAULT_LATENCY_BUCKETS)+1)
+
+        metrics = self.client.get('/metrics').get_data(as_text=True)
+        self.assertTrue('# TYPE flask_response_duration_seconds histogram\n' in metrics)
+        self.assertTrue('flask_response_duration_seconds_bucket{endpoint="timed_view",phase="view",le="+Inf"} 3\n' in metrics)
+        self.assertTrue('flask_response_duration_seconds_count{endpoint="timed_view",phase="build"} 3\n' in metrics)
+
+    def test_async_view(self):
+        try:
+            import asgiref
+        except ImportError:
+            self.skipTest('flask[async] is not installed')
+
+        response = self.client.get('/async/1')
+        self.assertEqual(response.get_data(), b'async 1 True')
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+        self.assertEqual(response.headers['ETag'], '"v1"')
+        self.assertTrue('Date' in response.headers)
+        self.assertTrue('Server-Timing' in response.headers)
+
+        response = self.client.get('/async/1', headers={'If-None-Match': '"v1"'})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['Cache-Control'], 'public,s-maxage=10')
+
+        response = self.client.get('/async/2', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(response.get_data()), b'async 2 True')
+        self.assertEqual(response.headers['ETag'], 'W/"v2"')
+
+        async def async_view():
+            return 'async'
+        self.assertRaises(TypeError, cached_response(10), async_view)
+        self.assertRaises(TypeError, single_flight(), async_view)
+
+
+def _connect_test_redis():
+    try:
+        import fakeredis
+        return fakeredis.FakeStrictRedis()
+    except ImportError:
+        pass
+    try:
+        import redis
+        strict_redis = redis.StrictRedis(db=10)
+        strict_redis.ping()
+        return strict_redis
+    except Exception:
+        return None
+
+
+class RedisResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.strict_redis = _connect_test_redis()
+        if self.strict_redis is None:
+            self.skipTest('neither fakeredis nor redis server is available')
+        self.cache = RedisResponseCache(self.strict_redis, prefix='test_response_cache:')
+        self.cache.clear()
+
+        self.app = flask.Flask(__name__)
+        self.call_count = {'cached': 0}
+        call_count = self.call_count
+
+        @self.app.route('/redis_cached')
+        @cached_response(10, cache=self.cache, headers={'X-Template': 'yes'})
+        def redis_cached_view():
+            call_count['cached'] += 1
+            return 'body '*100
+
+        self.client = self.app.test_client()
+
+    def tearDown(self):
+        self.cache.clear()
+
+    def test_redis_response_cache(self):
+        now = time.time()
+        for i in range(2):
+            response = self.client.get('/redis_cached')
+            self.assertEqual(response.get_data(), b'body '*100)
+            self.assertEqual(response.headers['X-Template'], 'yes')
+        self.assertEqual(self.call_count['cached'], 1, 'cached response is not used')
+
+        redis_key = 'test_response_cache:/redis_cached\n'
+        self.assertTrue(self.strict_redis.ttl(redis_key) <= 11)
+        self.assertTrue(len(self.strict_redis.hget(redis_key, 'body')) < len(b'body '*100), 'body is not compressed')
+        self.assertTrue(self.cache.get('/redis_cached\n', now+11) is None, 'expired response is used')
+
+        # another process shares redis but not L1
+        l1 = ResponseCache()
+        another_cache = RedisResponseCache(self.strict_redis, prefix='test_response_cache:', l1=l1)
+        cached = another_cache.get('/redis_cached\n', now)
+        self.assertEqual(cached.body, b'body '*100)
+        self.assertEqual(dict(cached.headers)['X-Template'], 'yes')
+        self.assertEqual(len(l1), 1)
+        another_cache.delete('/redis_cached\n')
+        self.assertEqual(len(l1), 0)
+        self.assertTrue(self.cache.get('/redis_cached\n', now) is None)
+
 
+if __name__ == '__main__':
+    unittest.main()
@@ -23,7 +23,16 @@
 ################################################################################
 
 
+import sys
+import os
+import io
 import re
+import struct
+import heapq
+import bisect
+import itertools
+import tempfile
+import multiprocessing
 
 
 def natural_sort_key(string):
@@ -35,3 +44,643 @@ def natural_sort_key(string):
         return int_item
     return tuple(map(__try_to_parse_number, re.split('(\d+)', string)))
 
+
+def __parse_decimal_number(item):
+    if u'.' in item:
+        return float(item)
+    return int(item)
+
+
+def __parse_version_number(item):
+    return tuple(map(int, item.split(u'.')))
+
+
+def __casefold(string):
+    try:
+        return string.casefold()
+    except AttributeError:
+        return string.lower()
+
+
+__natural_sort_key_cache = {}
+
+
+def make_natural_sort_key(ignore_case=False, signed=False, decimal=False, version=False, unicode_digits=True):
+    '''Generate key function for natural sort with given options.
+    ignore_case: compare text parts case-insensitively (casefold).
+    signed: accept leading '+' or '-' as sign of number.
+    decimal: accept fractional part like '3.14', number with fractional part is parsed as float.
+    version: parse dotted number like '1.10.2' as tuple of integers, can not be combined with signed or decimal.
+    unicode_digits: accept every Unicode decimal digit like fullwidth digits, otherwise only ASCII digits '0'-'9'.
+
+    All options are resolved here, and returned key function does not branch on them per call.
+    Key functions are cached, so same options always return same key function.
+    '''
+    options = (bool(ignore_case), bool(signed), bool(decimal), bool(version), bool(unicode_digits))
+    key_func = __natural_sort_key_cache.get(options)
+    if key_func is not None:
+        return key_func
+
+    if version and (signed or decimal):
+        raise ValueError('version can not be combined with signed or decimal')
+
+    digit_pattern = u'\\d' if unicode_digits else u'[0-9]'
+    number_pattern = u'%s+' % (digit_pattern,)
+    if version or decimal:
+        fraction_pattern = u'(?:\\.%s)' % (number_pattern,)
+        number_pattern += fraction_pattern+(u'*' if version else u'?')
+    if signed:
+        number_pattern = u'[-+]?'+number_pattern
+    split = re.compile(u'(%s)' % (number_pattern,), re.UNICODE).split
+
+    if version:
+        parse_number = __parse_version_number
+    elif decimal:
+        parse_number = __parse_decimal_number
+    else:
+        parse_number = int
+
+    if ignore_case:
+        casefold = __casefold
+        def key_func(string):
+            item_list = split(casefold(string))
+            item_list[1::2] = map(parse_number, item_list[1::2])
+            return tuple(item_list)
+    else:
+        def key_func(string):
+            item_list = split(string)
+            item_list[1::2] = map(parse_number, item_list[1::2])
+            return tuple(item_list)
+
+    __natural_sort_key_cache[options] = key_func
+    return key_func
+
+
+def __encode_bytes_key_text(text):
+    # NUL is escaped so that the text terminator sorts before every character
+    return text.encode('utf-8', 'surrogatepass').replace(b'\x00', b'\x00\xff')+b'\x00\x01'
+
+
+def __encode_bytes_key_number(number):
+    digits = ('%d' % (number,)).encode('ascii')
+    digit_len = len(digits)
+    if digit_len < 0xff:
+        length_prefix = struct.pack('>B', digit_len)
+    else:
+        length_prefix = struct.pack('>BI', 0xff, digit_len)
+    return length_prefix+digits
+
+
+def natural_sort_bytes_key(string):
+    '''Generate memcmp-comparable key for natural sort.
+    Comparing two returned bytes with plain byte comparison gives the same order as comparing their natural_sort_key().
+    So natural order can be served by byte-ordered storage, like redis ZSET lex range or LMDB/RocksDB keys.
+
+    Text parts are encoded in UTF-8 and terminated by b'\\x00\\x01' (NUL inside text is escaped to b'\\x00\\xff').
+    Number parts are encoded as decimal digits without leading zeros, prefixed by digit count,
+    so longer numbers sort after shorter numbers.
+    '''
+    key_part_list = []
+    for (i, item) in enumerate(natural_sort_key(string)):
+        if i&0x1:
+            key_part_list.append(__encode_bytes_key_number(item))
+        else:
+            key_part_list.append(__encode_bytes_key_text(item))
+    return b''.join(key_part_list)
+
+
+def __natural_sort_line_key(line):
+    return natural_sort_key(line.rstrip(u'\n'))
+
+
+def __read_run_file(run_path):
+    with io.open(run_path, 'r', encoding='utf-8', newline='\n') as fp:
+        for line in fp:
+            yield line
+
+
+def __write_run_file(line_iter, tmp_dir):
+    (fd, run_path) = tempfile.mkstemp(prefix='natural_sort_', suffix='.run', dir=tmp_dir)
+    with io.open(fd, 'w', encoding='utf-8', newline='\n') as fp:
+        fp.writelines(line_iter)
+    return run_path
+
+
+def _sort_run_to_file(line_list, tmp_dir):
+    line_list.sort(key=__natural_sort_line_key)
+    return __write_run_file(line_list, tmp_dir)
+
+
+def _sort_run_to_file_star(args):
+    return _sort_run_to_file(*args)
+
+
+__DIGIT_RUN_PATTERN = re.compile(u'\\d+', re.UNICODE)
+__EMPTY_TUPLE_SIZE = sys.getsizeof(())
+__EMPTY_TEXT_SIZE = sys.getsizeof(u'')
+# header of non-ASCII text is larger than header of ASCII text
+__WIDE_TEXT_HEADER_SIZE = sys.getsizeof(u'\U0001f600')-4
+__NUMBER_SIZE = sys.getsizeof(1<<30)
+__POINTER_SIZE = struct.calcsize('P')
+
+
+def __estimate_line_memory(line):
+    '''Estimate memory of line in run, plus its natural_sort_key() tuple and references built by list.sort().
+    Text parts of key are estimated as large as whole line, so the estimate errs on the large side.
+    '''
+    line_size = sys.getsizeof(line)
+    text_header_size = __EMPTY_TEXT_SIZE if line_size-__EMPTY_TEXT_SIZE == len(line) else __WIDE_TEXT_HEADER_SIZE
+    number_count = len(__DIGIT_RUN_PATTERN.findall(line))
+    part_count = 2*number_count+1
+    key_size = __EMPTY_TUPLE_SIZE+__POINTER_SIZE*part_count+(number_count+1)*text_header_size+(line_size-text_header_size)+number_count*__NUMBER_SIZE
+    return line_size+key_size+2*__POINTER_SIZE
+
+
+def __iter_run(line_iter, run_memory):
+    line_list = []
+    used_memory = 0
+    for line in line_iter:
+        if not line.endswith(u'\n'):
+            line += u'\n'
+        line_list.append(line)
+        used_memory += __estimate_line_memory(line)
+        if used_memory >= run_memory:
+            yield line_list
+            line_list = []
+            used_memory = 0
+    if len(line_list) > 0:
+        yield line_list
+
+
+def __merge_run_files(run_path_list):
+    return heapq.merge(*map(__read_run_file, run_path_list), key=__natural_sort_line_key)
+
+
+def __remove_run_files(run_path_list):
+    for run_path in run_path_list:
+        try:
+            os.remove(run_path)
+        except OSError:
+            pass
+
+
+def external_natural_sort(line_iter, memory_budget=64*1024*1024, processes=None, tmp_dir=None, max_merge_fan_in=64):
+    '''Sort lines in natural order with bounded memory, yield sorted lines.
+    Lines are sorted by natural_sort_key() of line without trailing newline, and every yielded line ends with newline.
+
+    Input is cut into runs whose estimated size stays under memory_budget divided by number of processes.
+    The estimate includes natural_sort_key() tuples built while a run is sorted, which take several times the size of lines.
+    Each run is sorted in memory and spilled to temporary file in tmp_dir, then all run files are k-way merged by heapq.merge().
+    If processes is greater than 1, runs are sorted in parallel by multiprocessing pool.
+    If number of runs exceeds max_merge_fan_in, runs are merged in several passes to limit opened files.
+    Temporary files are removed after the generator is exhausted or closed.
+    '''
+    if processes is None or processes < 1:
+        processes = 1
+    if max_merge_fan_in < 2:
+        raise ValueError('max_merge_fan_in must be at least 2')
+    run_memory = max(memory_budget//processes, 1)
+    run_path_list = []
+    try:
+        run_iter = __iter_run(line_iter, run_memory)
+        if processes > 1:
+            pool = multiprocessing.Pool(processes)
+            try:
+                # imap pulls runs lazily, so only a few runs stay in memory at the same time
+                task_iter = ((line_list, tmp_dir) for line_list in run_iter)
+                for run_path in pool.imap(_sort_run_to_file_star, task_iter):
+                    run_path_list.append(run_path)
+            finally:
+                pool.terminate()
+                pool.join()
+        else:
+            for line_list in run_iter:
+                run_path_list.append(_sort_run_to_file(line_list, tmp_dir))
+
+        while len(run_path_list) > max_merge_fan_in:
+            merging_run_path_list = run_path_list[:max_merge_fan_in]
+            run_path_list.append(__write_run_file(__merge_run_files(merging_run_path_list), tmp_dir))
+            __remove_run_files(merging_run_path_list)
+            del run_path_list[:max_merge_fan_in]
+
+        for line in __merge_run_files(run_path_list):
+            yield line
+    finally:
+        __remove_run_files(run_path_list)
+
+
+def external_natural_sort_file(input_path, output_path, encoding='utf-8', **kwargs):
+    '''Sort lines of file input_path in natural order by external_natural_sort() and write them to output_path.
+    Keyword arguments are passed to external_natural_sort().
+    '''
+    with io.open(input_path, 'r', encoding=encoding, newline='') as input_fp:
+        line_iter = (line.rstrip(u'\r\n') for line in input_fp)
+        with io.open(output_path, 'w', encoding=encoding, newline='\n') as output_fp:
+            output_fp.writelines(external_natural_sort(line_iter, **kwargs))
+
+
+class NaturalSortedList(object):
+    '''Sorted list container which keeps items in natural order.
+    Items are stored in chunks of about load items,
+    so insertion and deletion only move items inside one small chunk instead of the whole list.
+    Chunk lengths are indexed by Fenwick tree, so positional access is O(log n).
+    Items with equal key keep insertion order.
+    '''
+    DEFAULT_LOAD = 1000
+
+    def __init__(self, iterable=None, key=natural_sort_key, load=DEFAULT_LOAD):
+        self.__key = key
+        self.__load = load
+        self.clear()
+        if iterable is not None:
+            self.update(iterable)
+
+    @property
+    def key(self):
+        return self.__key
+
+    def clear(self):
+        self.__lists = []
+        self.__keys = []
+        self.__maxes = []
+        self.__index = []
+        self.__len = 0
+
+    def __build_index(self):
+        index = list(map(len, self.__lists))
+        index_len = len(index)
+        for i in range(index_len):
+            parent = i|(i+1)
+            if parent < index_len:
+                index[parent] += index[i]
+        self.__index = index
+
+    def __update_index(self, pos, delta):
+        index = self.__index
+        index_len = len(index)
+        while pos < index_len:
+            index[pos] += delta
+            pos |= pos+1
+
+    def __chunk_offset(self, pos):
+        index = self.__index
+        offset = 0
+        pos -= 1
+        while pos >= 0:
+            offset += index[pos]
+            pos = (pos&(pos+1))-1
+        return offset
+
+    def __locate_index(self, idx):
+        if idx < 0:
+            idx += self.__len
+        if not 0 <= idx < self.__len:
+            raise IndexError('NaturalSortedList index out of range')
+        index = self.__index
+        index_len = len(index)
+        pos = 0
+        bit = 1<<(index_len.bit_length()-1)
+        while bit:
+            next_pos = pos+bit
+            if next_pos <= index_len and index[next_pos-1] <= idx:
+                idx -= index[next_pos-1]
+                pos = next_pos
+            bit >>= 1
+        return (pos, idx)
+
+    def __split_chunk(self, pos):
+        load = self.__load
+        lists = self.__lists
+        keys = self.__keys
+        lists.insert(pos+1, lists[pos][load:])
+        keys.insert(pos+1, keys[pos][load:])
+        del lists[pos][load:]
+        del keys[pos][load:]
+        self.__maxes.insert(pos, keys[pos][-1])
+        self.__build_index()
+
+    def add(self, item):
+        item_key = self.__key(item)
+        lists = self.__lists
+        keys = self.__keys
+        maxes = self.__maxes
+        if len(maxes) == 0:
+            lists.append([item])
+            keys.append([item_key])
+            maxes.append(item_key)
+            self.__len = 1
+            self.__build_index()
+            return
+
+        pos = bisect.bisect_right(maxes, item_key)
+        if pos == len(maxes):
+            pos -= 1
+            lists[pos].append(item)
+            keys[pos].append(item_key)
+            maxes[pos] = item_key
+        else:
+            idx = bisect.bisect_right(keys[pos], item_key)
+            lists[pos].insert(idx, item)
+            keys[pos].insert(idx, item_key)
+        self.__len += 1
+
+        if len(lists[pos]) > self.__load*2:
+            self.__split_chunk(pos)
+        else:
+            self.__update_index(pos, 1)
+
+    def update(self, iterable):
+        '''Add all items of iterable.
+        Large batch is merged by sorting all items once and rebuilding chunks.
+        '''
+        item_list = list(iterable)
+        if len(item_list)*4 < self.__len:
+            for item in item_list:
+                self.add(item)
+            return
+
+        key = self.__key
+        item_list = list(itertools.chain.from_iterable(self.__lists))+item_list
+        key_list = list(itertools.chain.from_iterable(self.__keys))+list(map(key, item_list[self.__len:]))
+        order = sorted(range(len(item_list)), key=key_list.__getitem__)
+        item_list = [item_list[i] for i in order]
+        key_list = [key_list[i] for i in order]
+
+        load = self.__load
+        self.__lists = [item_list[i:i+load] for i in range(0, len(item_list), load)]
+        self.__keys = [key_list[i:i+load] for i in range(0, len(key_list), load)]
+        self.__maxes = [chunk_keys[-1] for chunk_keys in self.__keys]
+        self.__len = len(item_list)
+        self.__build_index()
+
+    def __delete(self, pos, idx):
+        lists = self.__lists
+        keys = self.__keys
+        maxes = self.__maxes
+        del lists[pos][idx]
+        del keys[pos][idx]
+        self.__len -= 1
+
+        chunk_len = len(lists[pos])
+        if chunk_len > self.__load//2:
+            maxes[pos] = keys[pos][-1]
+            self.__update_index(pos, -1)
+        elif len(lists) > 1:
+            # merge small chunk into its neighbour
+            if pos == 0:
+                pos += 1
+            lists[pos-1].extend(lists[pos])
+            keys[pos-1].extend(keys[pos])
+            maxes[pos-1] = keys[pos-1][-1]
+            del lists[pos]
+            del keys[pos]
+            del maxes[pos]
+            if len(lists[pos-1]) > self.__load*2:
+                self.__split_chunk(pos-1)
+            else:
+                self.__build_index()
+        elif chunk_len > 0:
+            maxes[pos] = keys[pos][-1]
+            self.__update_index(pos, -1)
+        else:
+            self.clear()
+
+    def __locate_item(self, item):
+        item_key = self.__key(item)
+        maxes = self.__maxes
+        pos = bisect.bisect_left(maxes, item_key)
+        if pos == len(maxes):
+            return None
+        idx = bisect.bisect_left(self.__keys[pos], item_key)
+        # items with equal key may span several chunks
+        while pos < len(maxes):
+            chunk_list = self.__lists[pos]
+            chunk_keys = self.__keys[pos]
+            while idx < len(chunk_keys):
+                if chunk_keys[idx] != item_key:
+                    return None
+                if chunk_list[idx] == item:
+                    return (pos, idx)
+                idx += 1
+            pos += 1
+            idx = 0
+        return None
+
+    def discard(self, item):
+        location = self.__locate_item(item)
+        if location is not None:
+            self.__delete(*location)
+
+    def remove(self, item):
+        location = self.__locate_item(item)
+        if location is None:
+            raise ValueError('%s not in NaturalSortedList' % (repr(item),))
+        self.__delete(*location)
+
+    def pop(self, index=-1):
+        (pos, idx) = self.__locate_index(index)
+        item = self.__lists[pos][idx]
+        self.__delete(pos, idx)
+        return item
+
+    def __delitem__(self, index):
+        if isinstance(index, slice):
+            for i in sorted(range(*index.indices(self.__len)), reverse=True):
+                self.__delete(*self.__locate_index(i))
+        else:
+            self.__delete(*self.__locate_index(index))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            (start, stop, step) = index.indices(self.__len)
+            if step == 1:
+                return list(self.islice(start, stop))
+            return [self[i] for i in range(start, stop, step)]
+        (pos, idx) = self.__locate_index(index)
+        return self.__lists[pos][idx]
+
+    def __len__(self):
+        return self.__len
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.__lists)
+
+    def __reversed__(self):
+        return itertools.chain.from_iterable(map(reversed, reversed(self.__lists)))
+
+    def __contains__(self, item):
+        return self.__locate_item(item) is not None
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, repr(list(self)))
+
+    def index(self, item):
+        location = self.__locate_item(item)
+        if location is None:
+            raise ValueError('%s not in NaturalSortedList' % (repr(item),))
+        (pos, idx) = location
+        return self.__chunk_offset(pos)+idx
+
+    def count(self, item):
+        return sum(1 for other in self.irange(item, item) if other == item)
+
+    def __bisect(self, bisect_func, item):
+        item_key = self.__key(item)
+        maxes = self.__maxes
+        pos = bisect_func(maxes, item_key)
+        if pos == len(maxes):
+            return self.__len
+        return self.__chunk_offset(pos)+bisect_func(self.__keys[pos], item_key)
+
+    def bisect_left(self, item):
+        return self.__bisect(bisect.bisect_left, item)
+
+    def bisect_right(self, item):
+        return self.__bisect(bisect.bisect_right, item)
+
+    def islice(self, start=None, stop=None):
+        '''Iterate items from index start to index stop.'''
+        (start, stop, _) = slice(start, stop).indices(self.__len)
+        if start >= stop:
+            return iter(())
+        (pos, idx) = self.__locate_index(start)
+        lists = self.__lists
+        item_iter = itertools.chain(itertools.islice(lists[pos], idx, None), itertools.chain.from_iterable(lists[pos+1:]))
+        return itertools.islice(item_iter, stop-start)
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True)):
+        '''Iterate items whose natural order lies between minimum and maximum.'''
+        if minimum is None:
+            start = 0
+        elif inclusive[0]:
+            start = self.bisect_left(minimum)
+        else:
+            start = self.bisect_right(minimum)
+        if maximum is None:
+            stop = self.__len
+        elif inclusive[1]:
+            stop = self.bisect_right(maximum)
+        else:
+            stop = self.bisect_left(maximum)
+        return self.islice(start, stop)
+
+
+# test case
+
+import unittest
+import random
+
+
+class NaturalSortTestCase(unittest.TestCase):
+    def setUp(self):
+        self.__TEST_DATA = [
+            u'', u'a', u'a0', u'a00', u'a1', u'a01', u'a2', u'a9', u'a10', u'a10b', u'a10b2', u'a100',
+            u'a\x00', u'a\x00b', u'a b', u'ab', u'b', u'1', u'01', u'2', u'10', u'1a', u'x'+u'9'*300, u'x1'+u'0'*300,
+            u'x'+u'9'*254, u'x1'+u'0'*254, u'\u65b0\u5e79\u7dda2', u'\u65b0\u5e79\u7dda10', u'\U0001f600', u'\uffff',
+        ]
+
+    def test_natural_sort_key(self):
+        self.assertEqual(sorted([u'a10', u'a9', u'a1'], key=natural_sort_key), [u'a1', u'a9', u'a10'])
+
+    def test_natural_sort_bytes_key(self):
+        for string_1 in self.__TEST_DATA:
+            for string_2 in self.__TEST_DATA:
+                key_1 = natural_sort_key(string_1)
+                key_2 = natural_sort_key(string_2)
+                bytes_key_1 = natural_sort_bytes_key(string_1)
+                bytes_key_2 = natural_sort_bytes_key(string_2)
+                message = 'order of %s and %s is wrong' % (repr(string_1), repr(string_2))
+                self.assertEqual(key_1 < key_2, bytes_key_1 < bytes_key_2, message)
+                self.assertEqual(key_1 == key_2, bytes_key_1 == bytes_key_2, message)
+
+    def test_natural_sort_bytes_key_shuffle(self):
+        data = list(self.__TEST_DATA)
+        random.shuffle(data)
+        self.assertEqual(list(map(natural_sort_key, sorted(data, key=natural_sort_bytes_key))), sorted(map(natural_sort_key, data)))
+
+    def test_make_natural_sort_key(self):
+        self.assertTrue(make_natural_sort_key() is make_natural_sort_key())
+        self.assertEqual(make_natural_sort_key()(u'a10b2'), natural_sort_key(u'a10b2'))
+        self.assertEqual(sorted([u'B2', u'a10', u'A2', u'b1'], key=make_natural_sort_key(ignore_case=True)), [u'A2', u'a10', u'b1', u'B2'])
+        self.assertEqual(sorted([u't1', u't-3', u't+2', u't0'], key=make_natural_sort_key(signed=True)), [u't-3', u't0', u't1', u't+2'])
+        self.assertEqual(sorted([u'x1.5', u'x1.25', u'x1', u'x10'], key=make_natural_sort_key(decimal=True)), [u'x1', u'x1.25', u'x1.5', u'x10'])
+        self.assertEqual(sorted([u'v1.10.0', u'v1.9', u'v1.9.1', u'v2'], key=make_natural_sort_key(version=True)), [u'v1.9', u'v1.9.1', u'v1.10.0', u'v2'])
+        self.assertEqual(make_natural_sort_key()(u'p\uff11\uff12'), (u'p', 12, u''))
+        self.assertEqual(make_natural_sort_key(unicode_digits=False)(u'p\uff11\uff12'), (u'p\uff11\uff12',))
+        self.assertRaises(ValueError, make_natural_sort_key, version=True, decimal=True)
+
+    def __external_sort_test(self, processes):
+        data = [u'file%d.%s' % (random.randint(0, 10000), random.choice([u'txt', u'jpg', u'\u753b\u50cf'])) for i in range(5000)]
+        sorted_data = list(map(lambda line: line.rstrip(u'\n'), external_natural_sort(iter(data), memory_budget=16*1024, processes=processes, max_merge_fan_in=4)))
+        self.assertEqual(list(map(natural_sort_key, sorted_data)), sorted(map(natural_sort_key, data)))
+        self.assertEqual(sorted(sorted_data), sorted(data))
+
+    def test_external_natural_sort(self):
+        self.__external_sort_test(None)
+
+    def test_external_natural_sort_parallel(self):
+        self.__external_sort_test(2)
+
+    def test_external_natural_sort_file(self):
+        data = [u'a10', u'a9', u'', u'a1', u'b']
+        (fd, input_path) = tempfile.mkstemp()
+        (output_fd, output_path) = tempfile.mkstemp()
+        os.close(output_fd)
+        try:
+            with io.open(fd, 'w', encoding='utf-8', newline='') as fp:
+                fp.write(u'\r\n'.join(data))
+            external_natural_sort_file(input_path, output_path)
+            with io.open(output_path, 'r', encoding='utf-8', newline='') as fp:
+                self.assertEqual(fp.read(), u'\na1\na9\na10\nb\n')
+        finally:
+            os.remove(input_path)
+            os.remove(output_path)
+
+    def test_natural_sorted_list(self):
+        data = [u'img%d.png' % (random.randint(0, 500),) for i in range(3000)]
+        sorted_list = NaturalSortedList(load=16)
+        expected = []
+        for item in data:
+            sorted_list.add(item)
+            expected.append(item)
+        expected.sort(key=natural_sort_key)
+        self.assertEqual(list(sorted_list), expected)
+        self.assertEqual(len(sorted_list), len(expected))
+        self.assertEqual(list(reversed(sorted_list)), list(reversed(expected)))
+        for i in range(0, len(expected), 7):
+            self.assertEqual(sorted_list[i], expected[i])
+            self.assertEqual(sorted_list[-i-1], expected[-i-1])
+        self.assertEqual(sorted_list[100:200], expected[100:200])
+        self.assertEqual(sorted_list[::3], expected[::3])
+
+        self.assertEqual(list(sorted_list.irange(u'img10.png', u'img20.png')), [item for item in expected if natural_sort_key(u'img10.png') <= natural_sort_key(item) <= natural_sort_key(u'img20.png')])
+        self.assertEqual(sorted_list.bisect_left(u'img100.png'), sum(1 for item in expected if natural_sort_key(item) < natural_sort_key(u'img100.png')))
+        self.assertEqual(sorted_list.index(expected[1234]), expected.index(expected[1234]))
+        self.assertEqual(sorted_list.count(expected[0]), expected.count(expected[0]))
+
+        random.shuffle(data)
+        for (i, item) in enumerate(data[:len(data)//2]):
+            sorted_list.remove(item)
+            expected.remove(item)
+            if i%97 == 0:
+                self.assertEqual(list(sorted_list), expected)
+                self.assertEqual(sorted_list[len(expected)//2], expected[len(expected)//2])
+        while len(expected) > 0:
+            self.assertEqual(sorted_list.pop(0), expected.pop(0))
+        self.assertEqual(len(sorted_list), 0)
+        self.assertRaises(ValueError, sorted_list.remove, u'img1.png')
+        self.assertRaises(IndexError, sorted_list.pop)
+
+    def test_natural_sorted_list_update(self):
+        sorted_list = NaturalSortedList([u'a10', u'a2'], load=4)
+        sorted_list.update([u'a%d' % (i,) for i in range(20)])
+        sorted_list.add(u'a02')
+        self.assertEqual(list(sorted_list), sorted([u'a10', u'a2']+[u'a%d' % (i,) for i in range(20)]+[u'a02'], key=natural_sort_key))
+        self.assertTrue(u'a02' in sorted_list)
+        del sorted_list[0:5]
+        self.assertEqual(sorted_list[0], u'a3')
+
+
+if __name__ == '__main__':
+    unittest.main()
+